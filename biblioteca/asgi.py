@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'biblioteca.settings')
+# Bajo ASGI las vistas de lectura van en su versión async (ver settings.VISTAS_ASYNC).
+os.environ.setdefault('VISTAS_ASYNC', '1')
 
 application = get_asgi_application()
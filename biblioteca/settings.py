@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.InstrumentacionSQLMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -50,7 +52,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'biblioteca.urls'
+# VISTAS_ASYNC=1 (lo pone biblioteca/asgi.py) sirve las vistas de lectura
+# async de core/views_async.py; con WSGI quedan las sync de core/views.py.
+VISTAS_ASYNC = os.environ.get("VISTAS_ASYNC", "0") == "1"
+ROOT_URLCONF = 'biblioteca.urls_async' if VISTAS_ASYNC else 'biblioteca.urls'
 
 TEMPLATES = [
     {
@@ -73,10 +78,34 @@ WSGI_APPLICATION = 'biblioteca.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Perfil de SQLite para varios bibliotecarios a la vez (ver `manage.py bench_sqlite`):
+# - WAL: los lectores no se bloquean con el que escribe.
+# - synchronous=NORMAL: en WAL es seguro ante caídas del proceso y ahorra fsyncs.
+# - mmap/cache: lecturas desde memoria.
+# - busy_timeout + BEGIN IMMEDIATE: el que escribe toma el lock al empezar y
+#   espera su turno, en vez de fallar con "database is locked" al querer
+#   pasar de lectura a escritura en medio de la transacción.
+# SQLITE_TUNING=0 vuelve a la configuración por defecto.
+SQLITE_TUNING = os.environ.get("SQLITE_TUNING", "1") != "0"
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negativo = KiB → 64 MiB
+    "busy_timeout": 5000,      # ms
+    "temp_store": "MEMORY",
+}
+SQLITE_OPTIONS = {
+    "init_command": ";".join(f"PRAGMA {k}={v}" for k, v in SQLITE_PRAGMAS.items()),
+    "transaction_mode": "IMMEDIATE",
+    "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000,
+} if SQLITE_TUNING else {}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
     }
 }
 
@@ -132,3 +161,68 @@ MESSAGES_TAGS = {
     messages.SUCCESS:"success",
     messages.ERROR:"danger",
 }
+
+# Caché: CACHE_BACKEND=locmem (default, por proceso) | archivo | redis.
+# Con varios procesos (gunicorn, varios workers) usar archivo o redis para
+# que todos vean las mismas versiones del catálogo y del dashboard.
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "locmem")
+if CACHE_BACKEND == "redis":
+    CACHES = {"default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("REDIS_URL", "redis://127.0.0.1:6379/1"),
+    }}
+elif CACHE_BACKEND == "archivo":
+    CACHES = {"default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("CACHE_DIR", str(BASE_DIR / ".cache")),
+    }}
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# Segundos que el catálogo (tabla de libros_list y lista de categorías) se
+# sirve desde caché; cualquier cambio sube la versión y lo invalida antes.
+CATALOGO_CACHE_SEGUNDOS = 600
+
+# Segundos que se cachea cada respuesta del autocompletado de títulos
+# (por versión del catálogo: un préstamo o devolución la invalida antes).
+AUTOCOMPLETE_CACHE_SEGUNDOS = 30
+
+# Préstamos DEVUELTO con más de estos días pasan al archivo (archivar_prestamos).
+ARCHIVO_PRESTAMOS_DIAS = 365
+
+# Segundos que el dashboard se sirve desde caché (se invalida igual ante
+# cualquier cambio en Ejemplar/Prestamo).
+DASHBOARD_CACHE_SEGUNDOS = 300
+
+# Instrumentación SQL por request (core/middleware.py): Server-Timing + log "core.sql".
+SQL_INSTRUMENTACION = True
+# Máximo de queries esperado por vista (url_name). Si se pasa, el log sale como
+# WARNING y la respuesta lleva el header X-SQL-Presupuesto.
+SQL_PRESUPUESTOS = {
+    "libros_list": 6,
+    "libros_export": 4,
+    "dashboard": 8,
+    "prestamos_list": 4,
+    "prestamo_create": 10,
+    "titulos_disponibles": 2,
+    "prestamo_por_codigo": 6,
+    "devolucion_por_codigo": 6,
+    # Fijo, sin importar cuántos ítems traiga el lote (ver core/lotes.py).
+    "prestamos_lote": 10,
+}
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        # WARNING = sólo presupuestos excedidos; SQL_LOG_NIVEL=INFO = una línea por request.
+        "core.sql": {
+            "handlers": ["console"],
+            "level": os.environ.get("SQL_LOG_NIVEL", "WARNING"),
+            "propagate": False,
+        },
+    },
+}
@@ -18,18 +18,32 @@ from django.contrib import admin
 from django.urls import path
 from core import views
 
-urlpatterns = [
-    path('admin/', admin.site.urls),
-    path("",views.dashboard, name="dashboard"),
-    path("libros/", views.libros_list, name="libros_list"),
-    path("libros/exportar/", views.libros_export, name="libros_export"),
-    path("libros/nuevo/", views.libro_create, name="libro_create"),
-    path("libros/<int:pk>/eliminar", views.libro_eliminar, name="libro_eliminar"),
-    path("prestamos/", views.prestamos_list, name="prestamos_list"),
-    path("prestamos/nuevo/", views.prestamo_create, name="prestamo_create"),
-    path("prestamos/<int:pk>/devolver/", views.prestamo_devolver, name="prestamo_devolver"),
-    path("prestamos/<int:pk>/renovar/", views.prestamo_renovar, name="prestamo_renovar"),
-    path("prestamos/<int:pk>/eliminar/", views.prestamo_eliminar, name="prestamo_eliminar"),
-    path("categorias/create/", views.categoria_create_ajax, name="categoria_create_ajax"),
-    path("categorias/<int:pk>/delete/", views.categoria_delete, name="categoria_delete"),
-]
+
+def rutas(lectura=views):
+    """
+    `lectura` es el módulo con dashboard, libros_list, prestamos_list y
+    categoria_create_ajax: core.views (WSGI) o core.views_async (ASGI,
+    ver urls_async.py).
+    """
+    return [
+        path('admin/', admin.site.urls),
+        path("", lectura.dashboard, name="dashboard"),
+        path("libros/", lectura.libros_list, name="libros_list"),
+        path("libros/exportar/", views.libros_export, name="libros_export"),
+        path("libros/nuevo/", views.libro_create, name="libro_create"),
+        path("libros/<int:pk>/eliminar", views.libro_eliminar, name="libro_eliminar"),
+        path("prestamos/", lectura.prestamos_list, name="prestamos_list"),
+        path("prestamos/nuevo/", views.prestamo_create, name="prestamo_create"),
+        path("prestamos/titulos-disponibles/", views.titulos_disponibles, name="titulos_disponibles"),
+        path("prestamos/codigo/prestar/", views.prestamo_por_codigo, name="prestamo_por_codigo"),
+        path("prestamos/codigo/devolver/", views.devolucion_por_codigo, name="devolucion_por_codigo"),
+        path("prestamos/lote/", views.prestamos_lote, name="prestamos_lote"),
+        path("prestamos/<int:pk>/devolver/", views.prestamo_devolver, name="prestamo_devolver"),
+        path("prestamos/<int:pk>/renovar/", views.prestamo_renovar, name="prestamo_renovar"),
+        path("prestamos/<int:pk>/eliminar/", views.prestamo_eliminar, name="prestamo_eliminar"),
+        path("categorias/create/", lectura.categoria_create_ajax, name="categoria_create_ajax"),
+        path("categorias/<int:pk>/delete/", views.categoria_delete, name="categoria_delete"),
+    ]
+
+
+urlpatterns = rutas()
@@ -0,0 +1,9 @@
+"""
+Las mismas rutas que biblioteca/urls.py, con las vistas de lectura async
+(core/views_async.py). Es el ROOT_URLCONF cuando VISTAS_ASYNC=1 (asgi.py).
+"""
+from core import views_async
+
+from .urls import rutas
+
+urlpatterns = rutas(lectura=views_async)
@@ -1,5 +1,30 @@
-from django.contrib import admin
-from .models import Categoria, Titulo, Ejemplar, Prestamo
+from django.contrib import admin, messages
+from .models import Categoria, Titulo, Ejemplar, Prestamo, PrestamoArchivado
+from .categorizador import categorizador
+from .paginacion import PaginadorEstimado
+from . import busqueda, cache_catalogo, codigos, lotes, prestamos, stock
+
+
+class AdminTablaGrande(admin.ModelAdmin):
+    """
+    Base para changelists de tablas grandes: conteo estimado, sin el
+    COUNT(*) extra de "N en total", y búsqueda por índices en lugar de
+    los __icontains de search_fields (ver `buscar`).
+    """
+    paginator = PaginadorEstimado
+    show_full_result_count = False
+    # buscar(queryset, termino) -> queryset en las subclases; sin él, la
+    # búsqueda estándar de Django sobre search_fields.
+    buscar = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if self.buscar is None:
+            return super().get_search_results(request, queryset, search_term)
+        termino = search_term.strip()
+        if not termino:
+            return queryset, False
+        return self.buscar(queryset, termino), False
+
 
 @admin.register(Categoria)
 class CategoriaAdmin(admin.ModelAdmin):
@@ -8,24 +33,128 @@ class CategoriaAdmin(admin.ModelAdmin):
     ordering = ["nombre"]
 
 @admin.register(Titulo)
-class TituloAdmin(admin.ModelAdmin):
+class TituloAdmin(AdminTablaGrande):
     list_display= ("id","titulo","autor", "tipo", "editorial","anio")
     list_filter = ("tipo","editorial","anio","categorias")
-    search_fields = ("titulo", "autor","isbn")
+    search_fields = ("titulo", "autor","isbn")  # lo resuelve `buscar` (FTS / ISBN exacto)
     filter_horizontal = ["categorias"]
     ordering=["titulo"]
+    actions = ["asignar_categoria_por_keywords"]
+
+    def buscar(self, queryset, termino):
+        return busqueda.filtrar(queryset, termino) | queryset.filter(isbn=termino)
+
+    @admin.action(description="Asignar categoría por palabras clave")
+    def asignar_categoria_por_keywords(self, request, queryset):
+        engine = categorizador()
+        pares = [
+            (tid, engine.categoria_o_fallback(titulo))
+            for tid, titulo in queryset.values_list("id", "titulo").iterator()
+        ]
+        cats = {n: Categoria.objects.get_or_create(nombre=n)[0].id for n in {c for _, c in pares}}
+        through = Titulo.categorias.through
+        through.objects.bulk_create(
+            [through(titulo_id=tid, categoria_id=cats[c]) for tid, c in pares],
+            ignore_conflicts=True,
+        )
+        cache_catalogo.invalidar()
+        self.message_user(request, f"Categorías asignadas a {len(pares)} título(s).")
 
 @admin.register(Ejemplar)
-class EjemplarAdmin(admin.ModelAdmin):
+class EjemplarAdmin(AdminTablaGrande):
     list_display=["id","titulo","codigo","estado"]
     list_filter=["estado","titulo__tipo"]
-    search_fields=["codigo","titulo__titulo"]
-    ordering=["titulo__titulo","id"]
+    search_fields=["codigo","titulo__titulo"]  # lo resuelve `buscar` (código exacto / FTS del título)
+    autocomplete_fields=["titulo"]
+    ordering=["-id"]
+
+    def get_queryset(self, request):
+        # __str__ usa el título: también lo necesitan el autocomplete y los FK de Prestamo.
+        return super().get_queryset(request).select_related("titulo")
+
+    def buscar(self, queryset, termino):
+        return queryset.filter(codigo=codigos.normalizar(termino)) | busqueda.filtrar(queryset, termino, prefijo="titulo__")
+
+    # Los contadores de stock de Titulo siguen a los cambios hechos desde el admin.
+    def save_model(self, request, obj, form, change):
+        antes = None
+        if change:
+            antes = Ejemplar.objects.filter(pk=obj.pk).values_list("titulo_id", "estado").first()
+        super().save_model(request, obj, form, change)
+        if antes:
+            stock.baja(*antes)
+        stock.alta(obj.titulo_id, obj.estado)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        stock.baja(obj.titulo_id, obj.estado)
+
+    def delete_queryset(self, request, queryset):
+        titulo_ids = set(queryset.values_list("titulo_id", flat=True))
+        super().delete_queryset(request, queryset)
+        stock.recalcular(titulo_ids)
 
 
 @admin.register(Prestamo)
-class PrestamoAdmin(admin.ModelAdmin):
+class PrestamoAdmin(AdminTablaGrande):
     list_display = ["id", "ejemplar", "alumno_nombre", "alumno_dni", "fecha_prestamo", "vence", "estado"]
-    list_filter = ["estado", "fecha_prestamo", "vence"]
-    search_fields = ["alumno_nombre", "alumno_dni", "ejemplar__titulo__titulo"]
-    ordering = ["-fecha_prestamo"]
+    list_select_related = ["ejemplar__titulo"]
+    list_filter = ["estado", "vence"]
+    date_hierarchy = "fecha_prestamo"  # índice (fecha_prestamo, id)
+    search_fields = ["alumno_nombre", "alumno_dni", "ejemplar__titulo__titulo"]  # ver `buscar`
+    autocomplete_fields = ["ejemplar"]
+    ordering = ["-fecha_prestamo", "-id"]
+    actions = ["devolver_seleccionados", "renovar_seleccionados"]
+
+    def buscar(self, queryset, termino):
+        # Sólo dígitos → prefijo de DNI (índice); si no, título (FTS) o comienzo del nombre.
+        if termino.isdigit():
+            return queryset.filter(busqueda.empieza_con("alumno_dni", termino))
+        return (busqueda.filtrar(queryset, termino, prefijo="ejemplar__titulo__")
+                | queryset.filter(alumno_nombre__istartswith=termino))
+
+    # Lotes: una transacción y UPDATE por conjunto (core/lotes.py), con resumen por ítem.
+    def _aplicar_lote(self, request, queryset, operacion, verbo):
+        try:
+            resultados = operacion(list(queryset.values_list("id", flat=True)))
+        except lotes.LoteDemasiadoGrande as e:
+            self.message_user(request, str(e), messages.ERROR)
+            return
+        except (prestamos.EjemplarNoDisponible, prestamos.SinPrestamoAbierto):
+            self.message_user(request, "Otro puesto modificó parte del lote; volvé a intentarlo.", messages.ERROR)
+            return
+        aplicados = sum(r.ok for r in resultados)
+        self.message_user(request, f"{verbo}: {aplicados} préstamo(s).")
+        rechazados = [f"#{r.item}: {r.detalle}" for r in resultados if not r.ok]
+        if rechazados:
+            self.message_user(request, f"Sin cambios en {len(rechazados)}: " + " · ".join(rechazados[:20]),
+                              messages.WARNING)
+
+    @admin.action(description="Devolver préstamos seleccionados")
+    def devolver_seleccionados(self, request, queryset):
+        self._aplicar_lote(request, queryset, lotes.devolver, "Devueltos")
+
+    @admin.action(description="Renovar préstamos seleccionados (+7 días)")
+    def renovar_seleccionados(self, request, queryset):
+        self._aplicar_lote(request, queryset, lotes.renovar, "Renovados")
+
+
+@admin.register(PrestamoArchivado)
+class PrestamoArchivadoAdmin(AdminTablaGrande):
+    """Sólo lectura: lo llena el comando archivar_prestamos."""
+    list_display = ["id", "titulo", "alumno_nombre", "alumno_dni", "fecha_prestamo", "vence"]
+    list_select_related = ["titulo"]
+    search_fields = ["alumno_nombre", "alumno_dni"]  # ver `buscar`
+    date_hierarchy = "fecha_prestamo"  # índice (fecha_prestamo, id)
+    ordering = ["-fecha_prestamo", "-id"]
+
+    def buscar(self, queryset, termino):
+        if termino.isdigit():
+            return queryset.filter(busqueda.empieza_con("alumno_dni", termino))
+        return queryset.filter(alumno_nombre__istartswith=termino)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
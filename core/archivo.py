@@ -0,0 +1,144 @@
+"""
+Archivo del historial de préstamos.
+
+La tabla caliente (core_prestamo) queda con los préstamos abiertos y los
+devueltos recientes; los DEVUELTO con fecha de préstamo anterior al
+horizonte (settings.ARCHIVO_PRESTAMOS_DIAS) pasan a core_prestamoarchivado.
+
+`archivar` trabaja por lotes (keyset por id): en cada lote, dentro de una
+transacción, copia las filas con un INSERT ... SELECT y las borra de la
+tabla caliente con el mismo predicado. Si se corta, volver a correrlo
+sigue desde donde quedó.
+
+`historial_prestamos` es la lectura unificada: une préstamos vigentes y
+archivados (UNION ALL) con las mismas columnas.
+"""
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BooleanField, CharField, F, Value
+
+from .busqueda import empieza_con
+from .models import Ejemplar, Prestamo, PrestamoArchivado
+from .paginacion import _filtro_despues
+
+LOTE = 5000
+
+# Columnas de historial_prestamos (mismo orden en las dos ramas del UNION).
+COLUMNAS = ("id", "alumno_nombre", "alumno_dni", "fecha_prestamo", "vence")
+ORDEN_HISTORIAL = ("-fecha_prestamo", "-id")
+
+
+def horizonte() -> int:
+    return getattr(settings, "ARCHIVO_PRESTAMOS_DIAS", 365)
+
+
+def archivables(hoy: date | None = None, dias: int | None = None):
+    corte = (hoy or date.today()) - timedelta(days=horizonte() if dias is None else dias)
+    return Prestamo.objects.filter(estado="DEVUELTO", fecha_prestamo__lt=corte), corte
+
+
+@dataclass
+class Progreso:
+    total: int = 0
+    archivados: int = 0
+    ultimo_id: int = 0
+    segundos: float = 0.0
+
+    @property
+    def por_segundo(self) -> float:
+        return self.archivados / self.segundos if self.segundos else 0.0
+
+
+def archivar(hoy: date | None = None, dias: int | None = None, lote: int = LOTE,
+             dry_run: bool = False, al_avanzar=None) -> Progreso:
+    """
+    Mueve al archivo los DEVUELTO más viejos que el horizonte.
+    `al_avanzar(progreso)` se llama después de cada lote confirmado.
+    Con dry_run cada lote se deshace al terminar (los conteos son los reales).
+    """
+    t0 = time.perf_counter()
+    pendientes, corte = archivables(hoy, dias)
+    pendientes = pendientes.order_by("id")
+    prog = Progreso(total=pendientes.count())
+
+    while True:
+        ids = list(pendientes.filter(id__gt=prog.ultimo_id).values_list("id", flat=True)[:lote])
+        if not ids:
+            break
+        with transaction.atomic():
+            movidos = _mover(ids[0], ids[-1], corte)
+            if dry_run:
+                transaction.set_rollback(True)
+        prog.archivados += movidos
+        prog.ultimo_id = ids[-1]
+        prog.segundos = time.perf_counter() - t0
+        if al_avanzar:
+            al_avanzar(prog)
+
+    prog.segundos = time.perf_counter() - t0
+    return prog
+
+
+def _mover(desde_id, hasta_id, corte) -> int:
+    """Copia y borra el tramo [desde_id, hasta_id] (sólo las filas archivables)."""
+    q = connection.ops.quote_name
+    prestamo, archivado, ejemplar = (q(m._meta.db_table) for m in (Prestamo, PrestamoArchivado, Ejemplar))
+    # Mismo predicado en el INSERT y en el DELETE, dentro de la misma transacción.
+    donde = "{p}id BETWEEN %s AND %s AND {p}estado = 'DEVUELTO' AND {p}fecha_prestamo < %s"
+    params = [desde_id, hasta_id, corte]
+    with connection.cursor() as cur:
+        cur.execute(
+            f"INSERT INTO {archivado} (id, ejemplar_id, titulo_id, alumno_nombre, alumno_dni, fecha_prestamo, vence) "
+            f"SELECT p.id, p.ejemplar_id, e.titulo_id, p.alumno_nombre, p.alumno_dni, p.fecha_prestamo, p.vence "
+            f"FROM {prestamo} p LEFT JOIN {ejemplar} e ON e.id = p.ejemplar_id WHERE {donde.format(p='p.')}",
+            params,
+        )
+        # DELETE directo: el del ORM mandaría señales fila por fila.
+        cur.execute(f"DELETE FROM {prestamo} WHERE {donde.format(p='')}", params)
+        return cur.rowcount
+
+
+# -------------------------------------------------------------------
+# Lectura unificada
+# -------------------------------------------------------------------
+def _filtrar(qs, dni=None, titulo_id=None, desde=None, hasta=None, antes_de=None, campo_titulo="titulo_id"):
+    if dni:
+        qs = qs.filter(empieza_con("alumno_dni", dni))
+    if titulo_id:
+        qs = qs.filter(**{campo_titulo: titulo_id})
+    if desde:
+        qs = qs.filter(fecha_prestamo__gte=desde)
+    if hasta:
+        qs = qs.filter(fecha_prestamo__lte=hasta)
+    if antes_de:
+        qs = qs.filter(_filtro_despues(ORDEN_HISTORIAL, list(antes_de)))
+    return qs
+
+
+def historial_prestamos(dni: str | None = None, titulo_id: int | None = None,
+                        desde: date | None = None, hasta: date | None = None,
+                        antes_de: tuple | None = None):
+    """
+    Préstamos vigentes + archivados como un solo queryset de dicts:
+    id, alumno_nombre, alumno_dni, fecha_prestamo, vence, libro, estado_final, archivado.
+    Ordenado por fecha de préstamo desc; `antes_de=(fecha, id)` pide la
+    página siguiente (keyset) aplicando el filtro en las dos ramas.
+    """
+    vigentes = _filtrar(Prestamo.objects.all(), dni, titulo_id, desde, hasta, antes_de,
+                        campo_titulo="ejemplar__titulo_id").values(
+        *COLUMNAS,
+        libro=F("ejemplar__titulo__titulo"),
+        estado_final=F("estado"),
+        archivado=Value(False, output_field=BooleanField()),
+    )
+    archivados = _filtrar(PrestamoArchivado.objects.all(), dni, titulo_id, desde, hasta, antes_de).values(
+        *COLUMNAS,
+        libro=F("titulo__titulo"),
+        estado_final=Value("DEVUELTO", output_field=CharField()),
+        archivado=Value(True, output_field=BooleanField()),
+    )
+    return vigentes.order_by().union(archivados.order_by(), all=True).order_by(*ORDEN_HISTORIAL)
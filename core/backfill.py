@@ -0,0 +1,219 @@
+"""
+Backfill de Prestamo.ejemplar para los préstamos heredados del modelo viejo
+(cuando el préstamo apuntaba a un "libro" y no a un ejemplar).
+
+Motor único que usan el comando `backfill_ejemplares` y
+scripts/backfill_ejemplares.py. Trabaja por lotes:
+1) toma N préstamos con ejemplar NULL (keyset por id),
+2) resuelve el título de cada uno contra un mapa en memoria
+   {título normalizado → Titulo.id} (sin una query por préstamo),
+3) busca un ejemplar por título en una sola query y crea con bulk_create
+   los que falten,
+4) graba los préstamos con un UPDATE ... FROM (VALUES ...) por tramo
+   (bulk_update en motores sin UPDATE FROM) y confirma el lote.
+
+Cada lote se confirma por separado: si se corta, volver a correrlo sigue
+desde donde quedó (los ya asignados dejan de tener ejemplar NULL) y
+`desde_id` permite saltear lo ya revisado sin match.
+
+El título del préstamo viejo sale de una "fuente":
+- FuenteColumna: columnas heredadas que hayan quedado en core_prestamo
+  (libro_titulo / libro como texto, o libro_id + tabla core_libro).
+- FuenteCSV: un CSV prestamo_id,titulo exportado del backup viejo.
+"""
+import csv
+import time
+from dataclasses import dataclass
+
+from django.db import connection, transaction
+
+from . import codigos, stock
+from .categorizador import normalizar
+from .models import Titulo, Ejemplar, Prestamo
+
+LOTE = 5000
+
+
+class FuenteNoDisponible(Exception):
+    """No hay de dónde sacar el título de los préstamos viejos."""
+
+
+# -------------------------------------------------------------------
+# Fuentes del título heredado
+# -------------------------------------------------------------------
+class FuenteColumna:
+    """Lee el título desde columnas heredadas de la tabla de préstamos."""
+
+    COLUMNAS_TEXTO = ("libro_titulo", "libro")
+
+    def __init__(self):
+        tabla = Prestamo._meta.db_table
+        with connection.cursor() as cur:
+            columnas = {c.name for c in connection.introspection.get_table_description(cur, tabla)}
+        tablas = set(connection.introspection.table_names())
+        q = connection.ops.quote_name
+
+        self.sql = None
+        for col in self.COLUMNAS_TEXTO:
+            if col in columnas:
+                self.descripcion = f"columna {tabla}.{col}"
+                self.sql = f"SELECT p.id, p.{q(col)} FROM {q(tabla)} p WHERE p.id IN ({{marcas}})"
+                break
+        else:
+            if "libro_id" in columnas and "core_libro" in tablas:
+                self.descripcion = f"{tabla}.libro_id → core_libro.titulo"
+                self.sql = (
+                    f"SELECT p.id, l.titulo FROM {q(tabla)} p "
+                    f"JOIN core_libro l ON l.id = p.libro_id WHERE p.id IN ({{marcas}})"
+                )
+        if self.sql is None:
+            raise FuenteNoDisponible(
+                f"{tabla} no tiene columnas heredadas ({', '.join(self.COLUMNAS_TEXTO)}, libro_id); "
+                "usá un CSV prestamo_id,titulo."
+            )
+
+    def titulos(self, prestamo_ids) -> dict:
+        with connection.cursor() as cur:
+            cur.execute(self.sql.format(marcas=", ".join(["%s"] * len(prestamo_ids))), list(prestamo_ids))
+            return {pid: texto for pid, texto in cur.fetchall() if texto}
+
+
+class FuenteCSV:
+    """CSV con columnas prestamo_id,titulo (encabezado obligatorio)."""
+
+    def __init__(self, ruta):
+        self.descripcion = f"CSV {ruta}"
+        self._mapa = {}
+        with open(ruta, newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            if not {"prestamo_id", "titulo"} <= set(reader.fieldnames or []):
+                raise FuenteNoDisponible(f"{ruta}: se esperan las columnas prestamo_id,titulo.")
+            for row in reader:
+                try:
+                    self._mapa[int(row["prestamo_id"])] = row["titulo"]
+                except (TypeError, ValueError):
+                    continue
+
+    def titulos(self, prestamo_ids) -> dict:
+        return {pid: self._mapa[pid] for pid in prestamo_ids if self._mapa.get(pid)}
+
+
+# -------------------------------------------------------------------
+# Motor
+# -------------------------------------------------------------------
+@dataclass
+class Progreso:
+    total: int = 0
+    procesados: int = 0
+    asignados: int = 0
+    creados: int = 0
+    sin_match: int = 0
+    ultimo_id: int = 0
+    segundos: float = 0.0
+
+    @property
+    def por_segundo(self) -> float:
+        return self.procesados / self.segundos if self.segundos else 0.0
+
+
+def mapa_titulos() -> dict:
+    """{título normalizado → id}, en una pasada por la tabla."""
+    mapa = {}
+    for tid, texto in Titulo.objects.order_by("id").values_list("id", "titulo").iterator(chunk_size=10_000):
+        mapa.setdefault(normalizar(texto), tid)
+    return mapa
+
+
+def backfill(fuente, lote: int = LOTE, desde_id: int = 0, dry_run: bool = False, al_avanzar=None) -> Progreso:
+    """
+    Asigna ejemplar a los préstamos con ejemplar NULL (id > desde_id).
+    `al_avanzar(progreso)` se llama después de cada lote confirmado.
+    Con dry_run cada lote se deshace al terminar (los conteos son los reales).
+    """
+    t0 = time.perf_counter()
+    huerfanos = Prestamo.objects.filter(ejemplar__isnull=True).order_by("id")
+    prog = Progreso(total=huerfanos.filter(id__gt=desde_id).count(), ultimo_id=desde_id)
+    mapa = mapa_titulos()
+
+    while True:
+        filas = list(huerfanos.filter(id__gt=prog.ultimo_id).values_list("id", "estado")[:lote])
+        if not filas:
+            break
+        with transaction.atomic():
+            _procesar_lote(filas, fuente, mapa, prog)
+            if dry_run:
+                transaction.set_rollback(True)
+        prog.procesados += len(filas)
+        prog.ultimo_id = filas[-1][0]
+        prog.segundos = time.perf_counter() - t0
+        if al_avanzar:
+            al_avanzar(prog)
+
+    prog.segundos = time.perf_counter() - t0
+    return prog
+
+
+def _procesar_lote(filas, fuente, mapa, prog):
+    textos = fuente.titulos([pid for pid, _ in filas])
+
+    titulo_de = {}     # prestamo_id → titulo_id
+    abierto = set()    # títulos con algún préstamo no devuelto en el lote
+    for pid, estado in filas:
+        tid = mapa.get(normalizar(textos.get(pid, "")))
+        if tid is None:
+            prog.sin_match += 1
+            continue
+        titulo_de[pid] = tid
+        if str(estado).upper() != "DEVUELTO":
+            abierto.add(tid)
+
+    if not titulo_de:
+        return
+
+    # Un ejemplar por título (el de menor id, como el .first() de antes).
+    ejemplar_de = {}
+    for tid, eid in (
+        Ejemplar.objects.filter(titulo_id__in=set(titulo_de.values()))
+        .order_by("titulo_id", "-id").values_list("titulo_id", "id")
+    ):
+        ejemplar_de[tid] = eid
+
+    faltan = sorted(set(titulo_de.values()) - ejemplar_de.keys())
+    if faltan:
+        nuevos = Ejemplar.objects.bulk_create([
+            Ejemplar(titulo_id=tid, estado="PRESTADO" if tid in abierto else "DISPONIBLE")
+            for tid in faltan
+        ], batch_size=1000)
+        ejemplar_de.update({e.titulo_id: e.id for e in nuevos})
+        codigos.generar()
+        stock.recalcular(faltan)
+        prog.creados += len(nuevos)
+
+    _asignar([(pid, ejemplar_de[tid]) for pid, tid in titulo_de.items()])
+    prog.asignados += len(titulo_de)
+
+
+def _asignar(pares):
+    """
+    Graba (prestamo_id, ejemplar_id). En SQLite >= 3.33 y PostgreSQL con
+    UPDATE ... FROM (VALUES ...): bulk_update arma un CASE WHEN por fila y
+    en lotes grandes el costo es armar esa expresión, no la DB.
+    """
+    vendor = connection.vendor
+    if not (vendor == "postgresql" or (vendor == "sqlite" and connection.Database.sqlite_version_info >= (3, 33))):
+        Prestamo.objects.bulk_update(
+            [Prestamo(id=pid, ejemplar_id=eid) for pid, eid in pares], ["ejemplar"], batch_size=1000,
+        )
+        return
+
+    tabla = connection.ops.quote_name(Prestamo._meta.db_table)
+    por_sentencia = max(1, min(5000, (connection.features.max_query_params or 10_000) // 2))
+    with connection.cursor() as cur:
+        for i in range(0, len(pares), por_sentencia):
+            tramo = pares[i:i + por_sentencia]
+            valores = ", ".join(["(%s, %s)"] * len(tramo))
+            cur.execute(
+                f"UPDATE {tabla} AS p SET ejemplar_id = v.column2 "
+                f"FROM (VALUES {valores}) AS v WHERE p.id = v.column1",
+                [x for par in tramo for x in par],
+            )
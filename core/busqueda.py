@@ -0,0 +1,245 @@
+"""
+Búsqueda de texto completo sobre Titulo (título + autor).
+
+Cada motor tiene su backend:
+- SQLite     → tabla virtual FTS5 `core_titulo_fts` (rowid = Titulo.id).
+- PostgreSQL → tabla `core_titulo_fts` con columna tsvector + índice GIN.
+- Otros      → LIKE / icontains (sin índice, sólo para no romper).
+
+Las búsquedas ignoran mayúsculas y acentos ("psicologia" encuentra
+"Psicología"), hacen match por prefijo en cada palabra y pueden ordenarse
+por relevancia. El índice se mantiene con las señales de Titulo
+(core/signals.py) y con `reindexar()` en las cargas masivas.
+"""
+import re
+import unicodedata
+
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+TABLA_FTS = "core_titulo_fts"
+
+
+def normalizar(texto: str) -> str:
+    """minúsculas + sin acentos/diacríticos + espacios colapsados."""
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(ch for ch in texto if not unicodedata.combining(ch))
+    return " ".join(texto.lower().split())
+
+
+def tokens(q: str) -> list[str]:
+    return re.findall(r"\w+", normalizar(q))
+
+
+# -------------------------------------------------------------------
+# Backends
+# -------------------------------------------------------------------
+class BackendBasico:
+    """Sin índice: filtra con icontains. No ordena por relevancia."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def crear_indice(self):
+        pass
+
+    def borrar_indice(self):
+        pass
+
+    def reindexar(self, ids=None):
+        pass
+
+    def eliminar(self, ids):
+        pass
+
+    def filtrar(self, qs, q: str, prefijo: str = ""):
+        q = (q or "").strip()
+        if not q:
+            return qs
+        return qs.filter(Q(**{f"{prefijo}titulo__icontains": q}) | Q(**{f"{prefijo}autor__icontains": q}))
+
+    def buscar(self, q: str, limite: int = 50) -> list[int]:
+        from .models import Titulo
+        return list(self.filtrar(Titulo.objects.order_by("titulo"), q).values_list("id", flat=True)[:limite])
+
+
+class BackendSQLite(BackendBasico):
+    """FTS5 con tokenizer unicode61 (remove_diacritics 2 = ignora acentos)."""
+
+    def crear_indice(self):
+        with self.connection.cursor() as cur:
+            cur.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} "
+                "USING fts5(titulo, autor, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+
+    def borrar_indice(self):
+        with self.connection.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {TABLA_FTS}")
+
+    def reindexar(self, ids=None):
+        with self.connection.cursor() as cur:
+            if ids is None:
+                cur.execute(f"DELETE FROM {TABLA_FTS}")
+                cur.execute(f"INSERT INTO {TABLA_FTS}(rowid, titulo, autor) SELECT id, titulo, autor FROM core_titulo")
+                return
+            for lote in _lotes(list(ids), 500):
+                marcas = ", ".join(["%s"] * len(lote))
+                cur.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid IN ({marcas})", lote)
+                cur.execute(
+                    f"INSERT INTO {TABLA_FTS}(rowid, titulo, autor) "
+                    f"SELECT id, titulo, autor FROM core_titulo WHERE id IN ({marcas})",
+                    lote,
+                )
+
+    def eliminar(self, ids):
+        with self.connection.cursor() as cur:
+            for lote in _lotes(list(ids), 500):
+                marcas = ", ".join(["%s"] * len(lote))
+                cur.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid IN ({marcas})", lote)
+
+    @staticmethod
+    def _match(q):
+        return " ".join(f'"{t}"*' for t in tokens(q))
+
+    def filtrar(self, qs, q: str, prefijo: str = ""):
+        expr = self._match(q)
+        if not expr:
+            return qs
+        return qs.filter(**{f"{prefijo}id__in": RawSQL(
+            f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s", [expr]
+        )})
+
+    def buscar(self, q: str, limite: int = 50) -> list[int]:
+        expr = self._match(q)
+        if not expr:
+            return []
+        with self.connection.cursor() as cur:
+            # bm25: más chico = más relevante; el título pesa el doble que el autor.
+            cur.execute(
+                f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s "
+                f"ORDER BY bm25({TABLA_FTS}, 2.0, 1.0), rowid LIMIT %s",
+                [expr, limite],
+            )
+            return [r[0] for r in cur.fetchall()]
+
+
+class BackendPostgres(BackendBasico):
+    """tsvector (config 'simple' + unaccent) con índice GIN."""
+
+    DOCUMENTO = (
+        "setweight(to_tsvector('simple', unaccent(t.titulo)), 'A') || "
+        "setweight(to_tsvector('simple', unaccent(t.autor)), 'B')"
+    )
+
+    def crear_indice(self):
+        with self.connection.cursor() as cur:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+            cur.execute(
+                f"CREATE TABLE IF NOT EXISTS {TABLA_FTS} ("
+                " titulo_id bigint PRIMARY KEY REFERENCES core_titulo(id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,"
+                " documento tsvector NOT NULL)"
+            )
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {TABLA_FTS}_gin ON {TABLA_FTS} USING gin (documento)")
+
+    def borrar_indice(self):
+        with self.connection.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {TABLA_FTS}")
+
+    def reindexar(self, ids=None):
+        sql = (
+            f"INSERT INTO {TABLA_FTS} (titulo_id, documento) "
+            f"SELECT t.id, {self.DOCUMENTO} FROM core_titulo t {{where}} "
+            "ON CONFLICT (titulo_id) DO UPDATE SET documento = EXCLUDED.documento"
+        )
+        with self.connection.cursor() as cur:
+            if ids is None:
+                cur.execute(f"DELETE FROM {TABLA_FTS}")
+                cur.execute(sql.format(where=""))
+                return
+            for lote in _lotes(list(ids), 5000):
+                cur.execute(sql.format(where="WHERE t.id = ANY(%s)"), [lote])
+
+    def eliminar(self, ids):
+        with self.connection.cursor() as cur:
+            cur.execute(f"DELETE FROM {TABLA_FTS} WHERE titulo_id = ANY(%s)", [list(ids)])
+
+    @staticmethod
+    def _tsquery(q):
+        return " & ".join(f"{t}:*" for t in tokens(q))
+
+    def filtrar(self, qs, q: str, prefijo: str = ""):
+        expr = self._tsquery(q)
+        if not expr:
+            return qs
+        return qs.filter(**{f"{prefijo}id__in": RawSQL(
+            f"SELECT titulo_id FROM {TABLA_FTS} WHERE documento @@ to_tsquery('simple', %s)", [expr]
+        )})
+
+    def buscar(self, q: str, limite: int = 50) -> list[int]:
+        expr = self._tsquery(q)
+        if not expr:
+            return []
+        with self.connection.cursor() as cur:
+            cur.execute(
+                f"SELECT titulo_id FROM {TABLA_FTS}, to_tsquery('simple', %s) consulta "
+                "WHERE documento @@ consulta "
+                "ORDER BY ts_rank(documento, consulta) DESC, titulo_id LIMIT %s",
+                [expr, limite],
+            )
+            return [r[0] for r in cur.fetchall()]
+
+
+BACKENDS = {
+    "sqlite": BackendSQLite,
+    "postgresql": BackendPostgres,
+}
+
+
+def backend(alias: str | None = None) -> BackendBasico:
+    if alias is None:
+        from .models import Titulo
+        alias = router.db_for_write(Titulo)
+    conn = connections[alias]
+    return BACKENDS.get(conn.vendor, BackendBasico)(conn)
+
+
+def _lotes(items, n):
+    for i in range(0, len(items), n):
+        yield items[i:i + n]
+
+
+# -------------------------------------------------------------------
+# API de uso en vistas / comandos
+# -------------------------------------------------------------------
+def filtrar(qs, q: str, prefijo: str = ""):
+    """
+    Restringe un queryset a las filas cuyo Titulo matchea `q` (sin cambiar el orden).
+    `prefijo` es el camino hasta Titulo, p.ej. "ejemplar__titulo__" para Prestamo.
+    """
+    return backend(qs.db).filtrar(qs, q, prefijo)
+
+
+def empieza_con(campo: str, texto: str) -> Q:
+    """
+    `campo` empieza con `texto`, escrito como rango (>= texto y < texto + U+10FFFF)
+    para que use un índice B-tree común: el LIKE de __startswith no lo usa en
+    SQLite (es case-insensitive) ni en PostgreSQL sin varchar_pattern_ops.
+    Distingue mayúsculas: pensado para DNIs y códigos de ejemplar.
+    """
+    return Q(**{f"{campo}__gte": texto, f"{campo}__lt": texto + "\U0010ffff"})
+
+
+def buscar(q: str, limite: int = 50) -> list[int]:
+    """Ids de Titulo que matchean `q`, ordenados por relevancia."""
+    return backend().buscar(q, limite)
+
+
+def reindexar(ids=None):
+    """Reindexa los títulos indicados (o todos si ids=None)."""
+    backend().reindexar(ids)
+
+
+def eliminar(ids):
+    backend().eliminar(ids)
@@ -0,0 +1,94 @@
+"""
+Caché del catálogo.
+
+- `categorias()`: lista de categorías (id, nombre) para los desplegables.
+- Fragmento de la tabla de `libros_list`: la clave lleva la "versión de
+  datos" del catálogo + la búsqueda, la página y el tamaño de página.
+
+No se borran claves: al cambiar un dato se incrementa la versión
+correspondiente y las claves viejas quedan huérfanas hasta que expiran.
+Las versiones las suben las señales de Titulo / Ejemplar / Categoria / la
+M2M de categorías (core/signals.py), los ajustes de stock (core/stock.py)
+y las cargas masivas que escriben sin señales.
+
+Con varios procesos hace falta un backend compartido (archivo o Redis,
+ver CACHE_BACKEND en settings); con locmem cada proceso ve sólo lo suyo.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import connection, transaction
+
+from .models import Categoria
+
+VERSION_CATALOGO = "catalogo:version"
+VERSION_CATEGORIAS = "catalogo:categorias:version"
+FRAGMENTO_TABLA = "catalogo_tabla"
+
+
+def _version(clave) -> int:
+    v = cache.get(clave)
+    if v is None:
+        # add() no pisa si otro proceso la creó entre el get y acá.
+        cache.add(clave, 1, None)
+        v = cache.get(clave, 1)
+    return v
+
+
+def _incr(clave) -> None:
+    try:
+        cache.incr(clave)
+    except ValueError:  # no existía (o expiró)
+        cache.set(clave, 2, None)
+
+
+def _subir(clave) -> None:
+    _incr(clave)
+    # Dentro de una transacción otro request puede cachear los datos viejos
+    # antes del COMMIT: se vuelve a subir cuando confirma.
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _incr(clave))
+
+
+def version() -> int:
+    return _version(VERSION_CATALOGO)
+
+
+def invalidar() -> None:
+    """Cambió algo de la tabla del catálogo (títulos, stock, vínculos)."""
+    _subir(VERSION_CATALOGO)
+
+
+def invalidar_categorias() -> None:
+    """Cambió la lista de categorías: afecta desplegables y la tabla (nombres)."""
+    _subir(VERSION_CATEGORIAS)
+    _subir(VERSION_CATALOGO)
+
+
+def segundos() -> int:
+    return getattr(settings, "CATALOGO_CACHE_SEGUNDOS", 600)
+
+
+def categorias() -> list[dict]:
+    """[{"id", "nombre"}] ordenadas por nombre."""
+    clave = f"catalogo:categorias:v{_version(VERSION_CATEGORIAS)}"
+    datos = cache.get(clave)
+    if datos is None:
+        datos = list(Categoria.objects.order_by("nombre").values("id", "nombre"))
+        cache.set(clave, datos, segundos())
+    return datos
+
+
+def vary_tabla(**params) -> list:
+    """Lo que distingue un fragmento de tabla de otro (mismo orden que en el template)."""
+    return [version(), params["q"], params["cat"], params["per_page"],
+            params["after"], params["before"], params["page"]]
+
+
+def tabla_html(vary_on) -> str | None:
+    """
+    HTML del fragmento de la tabla, si está en caché. Se lee una sola vez y
+    la vista lo pasa al template: si sólo se chequeara la clave, podría
+    expirar antes del {% cache %} y se cachearía una tabla vacía.
+    """
+    return cache.get(make_template_fragment_key(FRAGMENTO_TABLA, vary_on))
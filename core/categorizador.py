@@ -0,0 +1,94 @@
+"""
+Categorización de títulos por palabras clave.
+
+Las reglas se normalizan y compilan una sola vez: por regla queda una tupla
+de keywords ya normalizadas, sin las redundantes (las que contienen a otra
+keyword de la misma regla o de una regla anterior nunca pueden decidir).
+Se respeta la prioridad: gana la primera regla de KEYWORD_RULES que tenga
+alguna keyword contenida en el texto, igual que el recorrido original.
+
+Se usa desde import_libros, el alta de libros y el admin.
+"""
+
+CANONICAL_CATEGORIES = [
+    "Psicología",
+    "Social",
+    "Adolescencia/Niñez",
+    "Teología",
+    "Ética",
+    "Naturaleza",
+    "Informática",
+    "Género",
+    "Adicciones",
+    "Trabajo",
+    "Técnicas y Metodologías",
+    "Investigación/Análisis",
+]
+
+KEYWORD_RULES = [
+    (["social", "vida", "grupo", "sociales", "sociologia", "sociología", "comunidad", "individuo", "equipo", "familiar", "modelos", "edi"], "Social"),
+    (["psicologia", "salud mental", "psicología", "clinica", "clínica", "terapia", "emocional"], "Psicología"),
+    (["adolescencia", "adolescente", "juvenil", "infantil", "adopcion", "niñez", "ninez", "niños", "ninos"], "Adolescencia/Niñez"),
+    (["género", "genero", "mujeres", "esi", "femeninas"], "Género"),
+    (["teologia", "teología"], "Teología"),
+    (["ética", "etica"], "Ética"),
+    (["naturaleza"], "Naturaleza"),
+    (["informatica", "informática"], "Informática"),
+    (["drogas", "consumo"], "Adicciones"),
+    (["laboral", "práctica", "practica", "trabajo"], "Trabajo"),
+    (["metodologico", "metodologica", "tecnica", "técnica", "tecnicas", "metodos", "metodologicos", "elementos"], "Técnicas y Metodologías"),
+    (["investigacion", "análisis", "analisis", "teorias", "teorías"], "Investigación/Análisis"),
+]
+
+FALLBACK_CATEGORY = "Otros"
+
+_ACENTOS = str.maketrans({
+    "á": "a", "é": "e", "í": "i", "ó": "o", "ú": "u",
+    "ä": "a", "ë": "e", "ï": "i", "ö": "o", "ü": "u",
+    "ñ": "n",
+})
+
+
+def normalizar(s: str) -> str:
+    """minúsculas, sin tildes/diéresis/ñ y espacios colapsados."""
+    return " ".join((s or "").lower().translate(_ACENTOS).split())
+
+
+class Categorizador:
+    def __init__(self, reglas=KEYWORD_RULES):
+        self.reglas = []
+        vistas = []
+        for keywords, cat in reglas:
+            propias = []
+            # Primero las cortas: así se detectan las que contienen a otra.
+            for kw in sorted({normalizar(k) for k in keywords}, key=len):
+                if kw and not any(v in kw for v in vistas):
+                    propias.append(kw)
+                    vistas.append(kw)
+            self.reglas.append((tuple(propias), cat))
+
+    def categoria(self, *textos: str) -> str | None:
+        """Primera categoría (por prioridad de regla) que matchee, o None."""
+        hay = normalizar(" ".join(t for t in textos if t))
+        if not hay:
+            return None
+        for keywords, cat in self.reglas:
+            for kw in keywords:
+                if kw in hay:
+                    return cat
+        return None
+
+    def categoria_o_fallback(self, *textos: str) -> str:
+        cat = self.categoria(*textos)
+        return cat if cat in CANONICAL_CATEGORIES else FALLBACK_CATEGORY
+
+
+_default = None
+
+
+def categorizador() -> Categorizador:
+    """Instancia compartida (se compila la primera vez que se usa)."""
+    global _default
+    if _default is None:
+        _default = Categorizador()
+    return _default
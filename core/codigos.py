@@ -0,0 +1,58 @@
+"""
+Códigos de ejemplar (los que lleva la etiqueta / código de barras).
+
+Ejemplar.codigo es único e indexado: el mostrador resuelve un ejemplar
+escaneado con una sola búsqueda por índice (ver prestamos.prestar_por_codigo
+y prestamos.devolver_por_codigo). Los códigos se guardan normalizados
+(sin espacios, en mayúsculas).
+
+Los ejemplares sin código reciben uno generado a partir del id,
+EJ + id con 8 dígitos (EJ00001234): Ejemplar.save() lo asigna al crear y
+las cargas masivas (bulk_create) llaman a `generar()`, que completa por
+lotes con un UPDATE por tramo. El prefijo EJ queda reservado para estos
+códigos (Ejemplar.clean lo valida).
+"""
+from django.db import transaction
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat, LPad
+
+PREFIJO = "EJ"
+DIGITOS = 8
+LOTE = 10_000
+
+
+def normalizar(codigo) -> str:
+    return (codigo or "").strip().upper()
+
+
+def codigo_para(pk) -> str:
+    return f"{PREFIJO}{pk:0{DIGITOS}d}"
+
+
+def expresion():
+    """El mismo codigo_para(id), como expresión SQL para UPDATE masivos."""
+    return Concat(Value(PREFIJO), LPad(Cast("id", CharField()), DIGITOS, Value("0")), output_field=CharField())
+
+
+def generar(lote: int = LOTE, al_avanzar=None) -> int:
+    """
+    Asigna código a los ejemplares que no tienen (keyset por id, un UPDATE
+    y una transacción por lote). `al_avanzar(generados, ultimo_id)` se llama
+    después de cada lote. Devuelve cuántos generó.
+    """
+    from .models import Ejemplar
+
+    pendientes = Ejemplar.objects.filter(codigo__isnull=True).order_by("id")
+    generados, ultimo = 0, 0
+    while True:
+        ids = list(pendientes.filter(id__gt=ultimo).values_list("id", flat=True)[:lote])
+        if not ids:
+            break
+        with transaction.atomic():
+            generados += Ejemplar.objects.filter(
+                id__gte=ids[0], id__lte=ids[-1], codigo__isnull=True,
+            ).update(codigo=expresion())
+        ultimo = ids[-1]
+        if al_avanzar:
+            al_avanzar(generados, ultimo)
+    return generados
@@ -2,6 +2,8 @@ from django import forms
 from django.db import transaction
 from datetime import date, timedelta
 from .models import Titulo, Ejemplar, Prestamo, Categoria
+from .prestamos import reclamar_ejemplar, EjemplarNoDisponible
+from . import stock
 
 
 class LibroForm(forms.ModelForm):
@@ -37,6 +39,7 @@ class LibroForm(forms.ModelForm):
         titulo_obj = super().save(commit=commit)
         if not titulo_obj.ejemplares.exists():
             Ejemplar.objects.create(titulo=titulo_obj, estado="DISPONIBLE")
+            stock.alta(titulo_obj.pk, "DISPONIBLE")
         return titulo_obj
 
 
@@ -106,7 +109,8 @@ class PrestamoForm(forms.ModelForm):
         """
         - Setea fecha_prestamo (hoy) y estado=ACTIVO
         - Setea vence = fecha_devolucion (del form)
-        - Marca el Ejemplar como PRESTADO
+        - Marca el Ejemplar como PRESTADO (UPDATE condicional; si ya no estaba
+          DISPONIBLE lanza EjemplarNoDisponible y no se graba nada)
         """
         obj = super().save(commit=False)
         if not obj.fecha_prestamo:
@@ -115,9 +119,9 @@ class PrestamoForm(forms.ModelForm):
         obj.vence = self.cleaned_data["fecha_devolucion"]
 
         if commit:
+            # Reserva atómica: entre clean_ejemplar() y acá otra caja pudo llevárselo.
+            if not reclamar_ejemplar(obj.ejemplar_id):
+                raise EjemplarNoDisponible(obj.ejemplar_id)
+            obj.ejemplar.estado = "PRESTADO"
             obj.save()
-            ej = obj.ejemplar
-            if ej.estado != "PRESTADO":
-                ej.estado = "PRESTADO"
-                ej.save(update_fields=["estado"])
         return obj
@@ -0,0 +1,199 @@
+"""
+Operaciones en lote: devolver, renovar y prestar muchos ejemplares a la vez
+(fin de cuatrimestre: un curso devuelve 300 libros).
+
+Cada operación recibe ids de préstamo y/o códigos de ejemplar y trabaja
+en una sola transacción con una cantidad fija de sentencias, sin importar
+cuántos ítems traiga:
+1) resuelve todos los ítems con uno o dos SELECT (con FOR UPDATE donde el
+   motor lo tiene; en SQLite la transacción ya es serializable),
+2) aplica los cambios con UPDATE ... WHERE id IN (...) sobre Prestamo y
+   Ejemplar (bulk_create para los préstamos nuevos),
+3) recalcula los contadores de stock de los títulos tocados (un UPDATE)
+   e invalida el dashboard (los UPDATE no mandan señales).
+
+Devuelven un Resultado por ítem, en el orden pedido: los que no se pueden
+aplicar (código desconocido, ya devuelto, no disponible, repetido) quedan
+con ok=False y el resto se aplica igual.
+"""
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Case, Value, When
+
+from . import codigos, metricas, stock, vencimientos
+from .models import ESTADOS_PRESTAMO_ABIERTOS, Ejemplar, Prestamo
+from .prestamos import EjemplarNoDisponible, SinPrestamoAbierto
+
+MAX_ITEMS = 500
+PLAZO_RENOVACION = timedelta(days=7)
+CAMPOS = ("id", "estado", "vence", "ejemplar_id")
+
+
+class LoteDemasiadoGrande(ValueError):
+    """Más de MAX_ITEMS ítems en un lote."""
+
+
+@dataclass
+class Resultado:
+    item: str                    # lo pedido: id de préstamo o código de ejemplar
+    ok: bool
+    detalle: str
+    prestamo: int | None = None
+
+
+def _validar(*listas):
+    if sum(len(x) for x in listas) > MAX_ITEMS:
+        raise LoteDemasiadoGrande(f"Como máximo {MAX_ITEMS} ítems por lote.")
+
+
+def _bloquear(qs):
+    # Sin efecto en SQLite (no tiene FOR UPDATE): ahí la primera escritura
+    # falla si otra transacción confirmó cambios después de nuestra lectura.
+    return qs.select_for_update(of=("self",))
+
+
+def _resolver_prestamos(prestamo_ids, lista_codigos):
+    """
+    [(item, fila | None, error | None)] en el orden pedido. Por código se
+    toma el préstamo abierto del ejemplar. fila: dict con CAMPOS.
+    """
+    por_id = {}
+    if prestamo_ids:
+        por_id = {f["id"]: f for f in _bloquear(Prestamo.objects.filter(pk__in=prestamo_ids)).values(*CAMPOS)}
+
+    normalizados = [codigos.normalizar(c) for c in lista_codigos]
+    por_codigo, conocidos = {}, set()
+    if normalizados:
+        ejemplares = dict(Ejemplar.objects.filter(codigo__in=normalizados).values_list("id", "codigo"))
+        conocidos = set(ejemplares.values())
+        abiertos = Prestamo.objects.filter(ejemplar_id__in=ejemplares, estado__in=ESTADOS_PRESTAMO_ABIERTOS)
+        for f in _bloquear(abiertos).values(*CAMPOS):
+            por_codigo[ejemplares[f["ejemplar_id"]]] = f
+
+    salida = [(str(pid), por_id.get(pid), None if pid in por_id else "No existe el préstamo.")
+              for pid in prestamo_ids]
+    for c in normalizados:
+        if c in por_codigo:
+            salida.append((c, por_codigo[c], None))
+        else:
+            salida.append((c, None, "El ejemplar no tiene un préstamo abierto." if c in conocidos
+                           else "Código desconocido."))
+
+    # El mismo préstamo pedido dos veces (por id y por código, o repetido).
+    vistos = set()
+    for i, (item, fila, error) in enumerate(salida):
+        if fila is not None:
+            if fila["id"] in vistos:
+                salida[i] = (item, None, "Repetido en el lote.")
+            vistos.add(fila["id"])
+    return salida
+
+
+def _cerrar(ids, **cambios) -> None:
+    """UPDATE de los préstamos del lote, sólo si siguen abiertos."""
+    if Prestamo.objects.filter(pk__in=ids, estado__in=ESTADOS_PRESTAMO_ABIERTOS).update(**cambios) != len(ids):
+        # Otra caja cerró alguno entre la lectura y acá: se deshace el lote entero.
+        raise SinPrestamoAbierto("lote")
+
+
+def devolver(prestamo_ids=(), lista_codigos=()) -> list[Resultado]:
+    """Devuelve los préstamos (por id o por código de ejemplar) y libera sus ejemplares."""
+    _validar(prestamo_ids, lista_codigos)
+    resultados, ids, ejemplar_ids = [], [], set()
+    with transaction.atomic():
+        for item, fila, error in _resolver_prestamos(list(prestamo_ids), list(lista_codigos)):
+            if fila is not None and fila["estado"] == "DEVUELTO":
+                error = "Ya estaba devuelto."
+            if error:
+                resultados.append(Resultado(item, False, error, fila and fila["id"]))
+                continue
+            ids.append(fila["id"])
+            if fila["ejemplar_id"]:
+                ejemplar_ids.add(fila["ejemplar_id"])
+            resultados.append(Resultado(item, True, "Devuelto.", fila["id"]))
+
+        if ids:
+            _cerrar(ids, estado="DEVUELTO")
+            if ejemplar_ids:
+                titulo_ids = set(Ejemplar.objects.filter(pk__in=ejemplar_ids).values_list("titulo_id", flat=True))
+                Ejemplar.objects.filter(pk__in=ejemplar_ids).exclude(estado="DISPONIBLE").update(estado="DISPONIBLE")
+                stock.recalcular(titulo_ids)
+            metricas.invalidar()
+    return resultados
+
+
+def renovar(prestamo_ids=(), lista_codigos=(), hoy: date | None = None) -> list[Resultado]:
+    """
+    Suma 7 días al vencimiento de los préstamos abiertos (como prestamo_renovar):
+    los que aun así siguen en el pasado quedan VENCIDO.
+    """
+    _validar(prestamo_ids, lista_codigos)
+    hoy = hoy or date.today()
+    resultados, ids, vencimientos_previos = [], [], set()
+    with transaction.atomic():
+        for item, fila, error in _resolver_prestamos(list(prestamo_ids), list(lista_codigos)):
+            if fila is not None and fila["estado"] == "DEVUELTO":
+                error = "No se puede renovar un préstamo devuelto."
+            if error:
+                resultados.append(Resultado(item, False, error, fila and fila["id"]))
+                continue
+            ids.append(fila["id"])
+            vencimientos_previos.add(fila["vence"])
+            resultados.append(Resultado(item, True, f"Renovado hasta {fila['vence'] + PLAZO_RENOVACION}.", fila["id"]))
+
+        if ids:
+            # Un solo UPDATE con un CASE por vencimiento anterior (en un curso son
+            # pocas fechas distintas). `estado` va primero: así se evalúa con el
+            # vencimiento anterior también en motores que asignan en orden (MySQL).
+            previos = sorted(vencimientos_previos)
+            _cerrar(
+                ids,
+                estado=Case(*[When(vence=v, then=Value(vencimientos.estado_tras_renovar(v + PLAZO_RENOVACION, hoy)))
+                              for v in previos]),
+                vence=Case(*[When(vence=v, then=Value(v + PLAZO_RENOVACION)) for v in previos]),
+            )
+            metricas.invalidar()
+    return resultados
+
+
+def prestar(lista_codigos, *, alumno: str, dni: str, vence: date, fecha: date | None = None) -> list[Resultado]:
+    """Presta al mismo alumno todos los ejemplares escaneados que estén DISPONIBLE."""
+    _validar(lista_codigos)
+    normalizados = [codigos.normalizar(c) for c in lista_codigos]
+    resultados, ids, titulo_ids, vistos = [], [], set(), set()
+    with transaction.atomic():
+        filas = {
+            c: (eid, tid, estado)
+            for c, eid, tid, estado in _bloquear(Ejemplar.objects.filter(codigo__in=normalizados))
+            .values_list("codigo", "id", "titulo_id", "estado")
+        }
+        for c in normalizados:
+            if c not in filas:
+                resultados.append(Resultado(c, False, "Código desconocido."))
+            elif c in vistos:
+                resultados.append(Resultado(c, False, "Repetido en el lote."))
+            elif filas[c][2] != "DISPONIBLE":
+                resultados.append(Resultado(c, False, "El ejemplar no está disponible."))
+            else:
+                ids.append(filas[c][0])
+                titulo_ids.add(filas[c][1])
+                resultados.append(Resultado(c, True, "Prestado."))
+            vistos.add(c)
+
+        if ids:
+            if Ejemplar.objects.filter(pk__in=ids, estado="DISPONIBLE").update(estado="PRESTADO") != len(ids):
+                raise EjemplarNoDisponible("lote")
+            nuevos = Prestamo.objects.bulk_create([
+                Prestamo(ejemplar_id=eid, alumno_nombre=alumno, alumno_dni=dni,
+                         fecha_prestamo=fecha or date.today(), vence=vence, estado="ACTIVO")
+                for eid in ids
+            ])
+            por_ejemplar = {p.ejemplar_id: p.pk for p in nuevos}
+            for r in resultados:
+                if r.ok:
+                    r.prestamo = por_ejemplar.get(filas[r.item][0])
+            stock.recalcular(titulo_ids)
+            metricas.invalidar()
+    return resultados
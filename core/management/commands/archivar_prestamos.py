@@ -0,0 +1,54 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import archivo
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve los préstamos DEVUELTO con fecha de préstamo anterior al horizonte "
+        "(settings.ARCHIVO_PRESTAMOS_DIAS) a la tabla de archivo. Trabaja por lotes "
+        "confirmados: si se corta, se vuelve a correr y sigue. El historial completo "
+        "se lee con core.archivo.historial_prestamos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, default=None,
+                            help=f"Horizonte en días (default settings.ARCHIVO_PRESTAMOS_DIAS = {archivo.horizonte()}).")
+        parser.add_argument("--lote", type=int, default=archivo.LOTE,
+                            help=f"Préstamos por lote (default {archivo.LOTE}).")
+        parser.add_argument("--fecha", type=str, default=None,
+                            help="Fecha de referencia YYYY-MM-DD (default hoy).")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Simula y no graba cambios (hace rollback de cada lote).")
+
+    def handle(self, *args, **opts):
+        if opts["lote"] < 1:
+            raise CommandError("--lote debe ser >= 1.")
+        if opts["dias"] is not None and opts["dias"] < 0:
+            raise CommandError("--dias debe ser >= 0.")
+        hoy = None
+        if opts["fecha"]:
+            try:
+                hoy = datetime.strptime(opts["fecha"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("--fecha debe tener formato YYYY-MM-DD.")
+
+        _, corte = archivo.archivables(hoy, opts["dias"])
+        self.stdout.write(f"Archivando DEVUELTO con fecha de préstamo anterior a {corte.isoformat()}")
+
+        def _progreso(p):
+            pct = (p.archivados / p.total * 100) if p.total else 100
+            self.stdout.write(
+                f"  {p.archivados}/{p.total} ({pct:.0f}%) · último id {p.ultimo_id} · "
+                f"{p.por_segundo:,.0f} préstamos/s"
+            )
+
+        prog = archivo.archivar(hoy=hoy, dias=opts["dias"], lote=opts["lote"],
+                                dry_run=opts["dry_run"], al_avanzar=_progreso)
+        if opts["dry_run"]:
+            self.stdout.write(self.style.WARNING("Dry-run: se simularon cambios, no se guardó nada."))
+        self.stdout.write(self.style.SUCCESS(
+            f"Archivo finalizado en {prog.segundos:.1f}s → archivados: {prog.archivados}"
+        ))
@@ -1,80 +1,57 @@
-from django.core.management.base import BaseCommand
-from django.db import transaction
-from core.models import Prestamo, Titulo, Ejemplar
+from django.core.management.base import BaseCommand, CommandError
+
+from core import backfill, metricas
 
 
 class Command(BaseCommand):
     help = (
         "Vincula un Ejemplar a cada Prestamo que hoy tiene ejemplar = NULL.\n"
-        "- Si el modelo viejo tenía Prestamo.libro como FK a Titulo → usa ese Titulo.\n"
-        "- Si Prestamo.libro era un string (título) → busca Titulo por ese texto (case-insensitive).\n"
+        "- El título sale de las columnas heredadas de core_prestamo (libro_titulo / libro, "
+        "  o libro_id + core_libro) o de un CSV prestamo_id,titulo (--csv).\n"
+        "- Se busca el Titulo sin importar mayúsculas ni acentos.\n"
         "- Si no hay Ejemplar de ese Titulo, crea uno (PRESTADO si el préstamo no está devuelto; "
-        "  DISPONIBLE si ya se devolvió)."
+        "  DISPONIBLE si ya se devolvió).\n"
+        "Trabaja por lotes confirmados: si se corta, se vuelve a correr y sigue."
     )
 
     def add_arguments(self, parser):
         parser.add_argument(
             "--dry-run",
             action="store_true",
-            help="Simula y no graba cambios (hace rollback automático).",
+            help="Simula y no graba cambios (hace rollback de cada lote).",
         )
+        parser.add_argument("--csv", type=str, default=None,
+                            help="CSV con columnas prestamo_id,titulo (si no quedaron columnas heredadas).")
+        parser.add_argument("--lote", type=int, default=backfill.LOTE,
+                            help=f"Préstamos por lote (default {backfill.LOTE}).")
+        parser.add_argument("--desde-id", type=int, default=0,
+                            help="Retoma después de este id de préstamo (lo muestra el progreso).")
 
     def handle(self, *args, **opts):
-        dry = opts["dry_run"]
-        asignados = 0
-        creados = 0
-        sin_match = 0
-
+        if opts["lote"] < 1:
+            raise CommandError("--lote debe ser >= 1.")
         try:
-            with transaction.atomic():
-                qs = Prestamo.objects.filter(ejemplar__isnull=True)
-
-                for p in qs:
-                    t = None
-
-                    # Caso 1: Prestamo.libro era FK a Titulo (si todavía existe ese campo)
-                    if hasattr(p, "libro") and getattr(p, "libro", None) and hasattr(p.libro, "titulo"):
-                        t = p.libro
-
-                    # Caso 2: Prestamo.libro era texto (título)
-                    elif hasattr(p, "libro") and isinstance(p.libro, str) and p.libro.strip():
-                        t = Titulo.objects.filter(titulo__iexact=p.libro.strip()).first()
-
-                    # Caso 3 (opcional): si el campo viejo se llamaba distinto
-                    elif hasattr(p, "libro_titulo") and isinstance(p.libro_titulo, str) and p.libro_titulo.strip():
-                        t = Titulo.objects.filter(titulo__iexact=p.libro_titulo.strip()).first()
-
-                    if not t:
-                        sin_match += 1
-                        continue
-
-                    ej = Ejemplar.objects.filter(titulo=t).first()
-                    if not ej:
-                        # Si el préstamo NO está devuelto → el ejemplar nace PRESTADO
-                        esta_devuelto = False
-                        if hasattr(p, "estado"):
-                            esta_devuelto = (str(p.estado).upper() == "DEVUELTO")
-                        elif hasattr(p, "devuelto"):
-                            esta_devuelto = bool(p.devuelto)
-
-                        estado_ej = "DISPONIBLE" if esta_devuelto else "PRESTADO"
-                        ej = Ejemplar.objects.create(titulo=t, estado=estado_ej)
-                        creados += 1
-
-                    p.ejemplar = ej
-                    p.save(update_fields=["ejemplar"])
-                    asignados += 1
-
-                # En dry-run tiramos una excepción para forzar rollback del atomic,
-                # pero igual mostramos los conteos.
-                if dry:
-                    self.stdout.write(self.style.WARNING("Dry-run: se simularon cambios, no se guardó nada."))
-                    raise RuntimeError("Rollback (dry-run)")
-
-        except RuntimeError as ex:
-            if "dry-run" not in str(ex).lower():
-                raise
+            fuente = backfill.FuenteCSV(opts["csv"]) if opts["csv"] else backfill.FuenteColumna()
+        except (backfill.FuenteNoDisponible, OSError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"Fuente de títulos: {fuente.descripcion}")
+
+        def _progreso(p):
+            pct = (p.procesados / p.total * 100) if p.total else 100
+            self.stdout.write(
+                f"  {p.procesados}/{p.total} ({pct:.0f}%) · asignados {p.asignados} · "
+                f"creados {p.creados} · sin match {p.sin_match} · último id {p.ultimo_id} · "
+                f"{p.por_segundo:,.0f} préstamos/s"
+            )
+
+        prog = backfill.backfill(fuente, lote=opts["lote"], desde_id=opts["desde_id"],
+                                 dry_run=opts["dry_run"], al_avanzar=_progreso)
+        if opts["dry_run"]:
+            self.stdout.write(self.style.WARNING("Dry-run: se simularon cambios, no se guardó nada."))
+        elif prog.asignados:
+            metricas.invalidar()
 
         self.stdout.write(self.style.SUCCESS(
-            f"Backfill finalizado → asignados: {asignados} · ejemplares creados: {creados} · sin match: {sin_match}"
+            f"Backfill finalizado en {prog.segundos:.1f}s → asignados: {prog.asignados} · "
+            f"ejemplares creados: {prog.creados} · sin match: {prog.sin_match}"
         ))
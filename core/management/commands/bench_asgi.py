@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import queue
+import random
+import tempfile
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings
+
+from .bench_sqlite import Command as BenchSQLite
+from .benchmark import percentil
+
+RUTAS = ("/", "/libros/", "/prestamos/")
+
+
+class Command(BenchSQLite):
+    help = (
+        "Carga WSGI vs ASGI en el mismo proceso: N clientes lentos (tardan --lento-ms en "
+        "recibir cada respuesta) contra el handler WSGI con --workers hilos (vistas sync) "
+        "y contra el handler ASGI en un event loop (vistas de core/views_async.py). "
+        "Misma base SQLite temporal sembrada con seed_demo; reporta req/s y latencias."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clientes", type=int, default=100, help="Clientes concurrentes (default 100).")
+        parser.add_argument("--workers", type=int, default=8, help="Hilos del servidor WSGI (default 8).")
+        parser.add_argument("--lento-ms", type=float, default=200.0,
+                            help="Demora de cada cliente en recibir la respuesta (default 200).")
+        parser.add_argument("--segundos", type=float, default=10.0, help="Duración de cada corrida.")
+        parser.add_argument("--titulos", type=int, default=2000)
+        parser.add_argument("--prestamos", type=int, default=20_000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "sqlite":
+            raise CommandError("bench_asgi usa una base SQLite temporal.")
+        if opts["clientes"] < 1 or opts["workers"] < 1 or opts["segundos"] <= 0 or opts["lento_ms"] < 0:
+            raise CommandError("Se necesita --clientes >= 1, --workers >= 1, --segundos > 0 y --lento-ms >= 0.")
+
+        logger = logging.getLogger("core.sql")
+        nivel = logger.level
+        logger.setLevel(logging.ERROR)  # sin una línea de log por request
+        original = connections.settings["default"]
+        resultados = {}
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                self._usar(dict(original, NAME=str(Path(tmp) / "bench_asgi.sqlite3")))
+                self._preparar(opts)
+                self.urls = self._urls(opts["seed"])
+                with override_settings(DEBUG=False, ALLOWED_HOSTS=["localhost"]):
+                    with override_settings(ROOT_URLCONF="biblioteca.urls"):
+                        cache.clear()
+                        resultados[f"WSGI · {opts['workers']} hilos"] = self._wsgi(opts)
+                    with override_settings(ROOT_URLCONF="biblioteca.urls_async"):
+                        cache.clear()
+                        resultados["ASGI · vistas async"] = asyncio.run(self._asgi(opts))
+                self._cerrar()
+        finally:
+            self._usar(original)
+            logger.setLevel(nivel)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n{opts['clientes']} clientes · {opts['lento_ms']:.0f} ms de demora · {opts['segundos']:.0f}s"
+        ))
+        self.stdout.write(f"{'servidor':<22}{'req/s':>9}{'requests':>10}{'errores':>9}{'p50 ms':>9}{'p95 ms':>9}")
+        for nombre, r in resultados.items():
+            self.stdout.write(
+                f"{nombre:<22}{r['req_s']:>9.1f}{r['requests']:>10}{r['errores']:>9}"
+                f"{r['p50_ms']:>9.0f}{r['p95_ms']:>9.0f}"
+            )
+        wsgi, asgi = resultados.values()
+        if wsgi["req_s"]:
+            self.stdout.write(self.style.SUCCESS(f"ASGI / WSGI: x{asgi['req_s'] / wsgi['req_s']:.2f}"))
+
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _urls(seed):
+        """Mezcla de lecturas: dashboard, catálogo (búsquedas y páginas) y préstamos."""
+        rnd = random.Random(seed)
+        urls = []
+        for i in range(300):
+            ruta = RUTAS[i % len(RUTAS)]
+            params = {}
+            if ruta == "/libros/":
+                params = {"q": rnd.choice(["historia", "ciencia", "manual", "teoría", ""]),
+                          "per_page": rnd.choice([5, 10, 20])}
+            elif ruta == "/prestamos/":
+                params = {"estado": rnd.choice(["", "ACTIVO", "VENCIDO"])}
+            urls.append((ruta, urlencode(params)))
+        return urls
+
+    @staticmethod
+    def _resumen(latencias, errores, duracion):
+        latencias = latencias or [0.0]
+        return {
+            "requests": len(latencias),
+            "errores": errores,
+            "req_s": len(latencias) / duracion,
+            "p50_ms": percentil(latencias, 50),
+            "p95_ms": percentil(latencias, 95),
+        }
+
+    def _wsgi(self, opts):
+        """
+        Servidor de hilos: cada worker toma un request de la cola, lo atiende
+        y queda ocupado mientras el cliente lento recibe la respuesta.
+        """
+        app = WSGIHandler()
+        lento = opts["lento_ms"] / 1000
+        cola = queue.Queue()
+        t0 = time.perf_counter()
+        for n in range(opts["clientes"]):
+            cola.put((n, t0))
+        fin = t0 + opts["segundos"]
+        lock = threading.Lock()
+        latencias, errores = [], [0]
+
+        def _worker():
+            try:
+                while time.perf_counter() < fin:
+                    try:
+                        n, pedido = cola.get(timeout=0.05)
+                    except queue.Empty:
+                        continue
+                    ruta, qs = self.urls[(n * 7 + len(latencias)) % len(self.urls)]
+                    estado = []
+                    cuerpo = app(self._environ(ruta, qs), lambda status, headers: estado.append(status))
+                    for _ in cuerpo:
+                        pass
+                    cuerpo.close()
+                    time.sleep(lento)  # el socket no se libera hasta que el cliente leyó todo
+                    ahora = time.perf_counter()
+                    with lock:
+                        latencias.append((ahora - pedido) * 1000)
+                        errores[0] += not estado[0].startswith("200")
+                    cola.put((n, ahora))
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=_worker) for _ in range(opts["workers"])]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        return self._resumen(latencias, errores[0], time.perf_counter() - t0)
+
+    async def _asgi(self, opts):
+        """Un event loop: cada cliente espera su respuesta sin ocupar un worker."""
+        app = ASGIHandler()
+        lento = opts["lento_ms"] / 1000
+        t0 = time.perf_counter()
+        fin = t0 + opts["segundos"]
+        latencias, errores = [], [0]
+
+        async def _cliente(n):
+            while time.perf_counter() < fin:
+                ruta, qs = self.urls[(n * 7 + len(latencias)) % len(self.urls)]
+                terminado = asyncio.Event()
+                enviado = False
+                estado = []
+
+                async def receive():
+                    nonlocal enviado
+                    if not enviado:
+                        enviado = True
+                        return {"type": "http.request", "body": b"", "more_body": False}
+                    await terminado.wait()
+                    return {"type": "http.disconnect"}
+
+                async def send(mensaje):
+                    if mensaje["type"] == "http.response.start":
+                        estado.append(mensaje["status"])
+                    elif not mensaje.get("more_body"):
+                        await asyncio.sleep(lento)  # cliente lento recibiendo
+                        terminado.set()
+
+                inicio = time.perf_counter()
+                await app(self._scope(ruta, qs), receive, send)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+                errores[0] += estado[0] != 200
+
+        await asyncio.gather(*[_cliente(n) for n in range(opts["clientes"])])
+        return self._resumen(latencias, errores[0], time.perf_counter() - t0)
+
+    @staticmethod
+    def _environ(ruta, qs):
+        return {
+            "REQUEST_METHOD": "GET", "PATH_INFO": ruta, "QUERY_STRING": qs, "SCRIPT_NAME": "",
+            "SERVER_NAME": "localhost", "SERVER_PORT": "80", "HTTP_HOST": "localhost",
+            "SERVER_PROTOCOL": "HTTP/1.1", "REMOTE_ADDR": "127.0.0.1",
+            "wsgi.input": BytesIO(b""), "wsgi.url_scheme": "http", "wsgi.errors": BytesIO(),
+        }
+
+    @staticmethod
+    def _scope(ruta, qs):
+        return {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": ruta, "raw_path": ruta.encode(),
+            "query_string": qs.encode(), "root_path": "", "headers": [(b"host", b"localhost")],
+            "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+        }
@@ -0,0 +1,76 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.categorizador import KEYWORD_RULES, Categorizador
+
+
+# Implementación anterior (recorrido anidado y normalización en cada llamada),
+# se deja acá sólo como referencia para comparar.
+def _norm_text_original(s: str) -> str:
+    s = (s or "").strip().lower()
+    for a, b in (
+        ("á", "a"), ("é", "e"), ("í", "i"), ("ó", "o"), ("ú", "u"),
+        ("ä", "a"), ("ë", "e"), ("ï", "i"), ("ö", "o"), ("ü", "u"),
+        ("ñ", "n"),
+    ):
+        s = s.replace(a, b)
+    return " ".join(s.split())
+
+
+def categoria_por_keywords_original(*textos: str) -> str | None:
+    hay = _norm_text_original(" ".join([t for t in textos if t]))
+    if not hay:
+        return None
+    for keywords, cat in KEYWORD_RULES:
+        for kw in keywords:
+            if _norm_text_original(kw) in hay:
+                return cat
+    return None
+
+
+PALABRAS = [
+    "introducción", "manual", "historia", "teoría", "fundamentos", "práctica", "del", "de", "la", "los",
+    "pensamiento", "educación", "salud", "mental", "niñez", "comunidad", "derecho", "economía", "arte",
+    "filosofía", "ciencia", "política", "lenguaje", "trabajo", "investigación", "ética", "cuerpo",
+    "memoria", "literatura", "matemática", "cultura", "escuela", "familia", "ciudad", "poder", "Cosmos",
+]
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark: categorizador compilado vs. la implementación anterior sobre N títulos sintéticos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--n", type=int, default=100_000)
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **opts):
+        rnd = random.Random(opts["seed"])
+        titulos = [
+            " ".join(rnd.choice(PALABRAS) for _ in range(rnd.randint(2, 8))).capitalize()
+            for _ in range(opts["n"])
+        ]
+        categorias = [rnd.choice(["", "", "Social", "Psicología", "técnicas"]) for _ in titulos]
+
+        t0 = time.perf_counter()
+        viejo = [categoria_por_keywords_original(c, t) for c, t in zip(categorias, titulos)]
+        t_viejo = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        engine = Categorizador()
+        t_compilar = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        nuevo = [engine.categoria(c, t) for c, t in zip(categorias, titulos)]
+        t_nuevo = time.perf_counter() - t0
+
+        distintos = sum(1 for a, b in zip(viejo, nuevo) if a != b)
+        n = len(titulos)
+        self.stdout.write(f"Títulos: {n}")
+        self.stdout.write(f"  anterior:  {t_viejo:7.3f}s  ({n / t_viejo:,.0f} títulos/s)")
+        self.stdout.write(f"  compilado: {t_nuevo:7.3f}s  ({n / t_nuevo:,.0f} títulos/s, compilación {t_compilar * 1000:.1f} ms)")
+        self.stdout.write(self.style.SUCCESS(f"  mejora:    x{t_viejo / t_nuevo:.1f}"))
+        if distintos:
+            self.stdout.write(self.style.ERROR(f"  ¡{distintos} resultados distintos!"))
+        else:
+            self.stdout.write(self.style.SUCCESS("  resultados idénticos"))
@@ -0,0 +1,172 @@
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Q
+
+from core import codigos
+from core.models import Titulo, Ejemplar, Prestamo, ESTADOS_PRESTAMO_ABIERTOS
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark de índices: arma una base SQLite temporal con el esquema de core, "
+        "la siembra (por defecto 1M de préstamos) y compara planes (EXPLAIN QUERY PLAN) "
+        "y tiempos de las queries calientes sin y con los índices de Meta.indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prestamos", type=int, default=1_000_000)
+        parser.add_argument("--titulos", type=int, default=20_000)
+        parser.add_argument("--ejemplares", type=int, default=60_000)
+        parser.add_argument("--repeticiones", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--db", type=str, default=None,
+                            help="Ruta del .sqlite3 temporal (por defecto, en el directorio temporal).")
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "sqlite":
+            raise CommandError("bench_indices genera el esquema con el backend SQLite de Django.")
+
+        tmpdir = None
+        if opts["db"]:
+            ruta = Path(opts["db"])
+            ruta.unlink(missing_ok=True)
+        else:
+            tmpdir = tempfile.TemporaryDirectory()
+            ruta = Path(tmpdir.name) / "bench_indices.sqlite3"
+
+        db = sqlite3.connect(ruta)
+        try:
+            tablas, indices_base, indices_nuevos = self._ddl()
+            for sql in tablas + indices_base:
+                db.execute(sql)
+
+            t0 = time.perf_counter()
+            self._sembrar(db, opts)
+            self.stdout.write(f"Base sembrada en {time.perf_counter() - t0:.1f}s → {ruta}")
+
+            escenarios = self._escenarios()
+            db.execute("ANALYZE")
+            antes = self._medir(db, escenarios, opts["repeticiones"])
+
+            for sql in indices_nuevos:
+                db.execute(sql)
+            db.execute("ANALYZE")
+            despues = self._medir(db, escenarios, opts["repeticiones"])
+        finally:
+            db.close()
+            if tmpdir:
+                tmpdir.cleanup()
+
+        for nombre in escenarios:
+            a, d = antes[nombre], despues[nombre]
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{nombre}"))
+            self.stdout.write(f"  antes:   {a['ms']:9.2f} ms  plan: {a['plan']}")
+            self.stdout.write(f"  después: {d['ms']:9.2f} ms  plan: {d['plan']}")
+            if d["ms"]:
+                self.stdout.write(self.style.SUCCESS(f"  mejora:  x{a['ms'] / d['ms']:.1f}"))
+
+    # ---------------------------------------------------------------
+    def _ddl(self):
+        """
+        CREATE TABLE + índices de FK (lo que ya había) y, por separado,
+        los índices nuevos de Meta.indexes, generados por el schema editor.
+        """
+        modelos = [Titulo, Ejemplar, Prestamo]
+        tablas, base, nuevos = [], [], []
+        with connection.schema_editor(collect_sql=True, atomic=False) as ed:
+            for model in modelos:
+                sql, params = ed.table_sql(model)
+                if params:
+                    raise CommandError(f"DDL con parámetros no soportado ({model.__name__}).")
+                tablas.append(sql)
+                for field in model._meta.local_fields:
+                    base.extend(str(s) for s in ed._field_indexes_sql(model, field))
+                nuevos.extend(str(idx.create_sql(model, ed)) for idx in model._meta.indexes)
+        return tablas, base, nuevos
+
+    def _sembrar(self, db, opts):
+        rnd = random.Random(opts["seed"])
+        hoy = date.today()
+        n_t, n_e, n_p = opts["titulos"], opts["ejemplares"], opts["prestamos"]
+
+        db.executemany(
+            "INSERT INTO core_titulo (id, titulo, autor, tipo, lugar_edicion, editorial, anio, edicion, isbn, "
+            "disponibles, prestados) VALUES (?, ?, '', 'LIBRO', '', '', '', '', '', 0, 0)",
+            ((i, f"Titulo {i:07d}") for i in range(1, n_t + 1)),
+        )
+        # ~8% de ejemplares prestados; el resto disponibles.
+        db.executemany(
+            "INSERT INTO core_ejemplar (id, titulo_id, codigo, estado) VALUES (?, ?, ?, ?)",
+            ((i, rnd.randint(1, n_t), codigos.codigo_para(i), "PRESTADO" if rnd.random() < 0.08 else "DISPONIBLE")
+             for i in range(1, n_e + 1)),
+        )
+        # Contadores de stock (core/stock.py) a partir de los ejemplares sembrados.
+        db.execute(
+            "UPDATE core_titulo SET "
+            "disponibles = (SELECT COUNT(*) FROM core_ejemplar e WHERE e.titulo_id = core_titulo.id "
+            "AND e.estado = 'DISPONIBLE'), "
+            "prestados = (SELECT COUNT(*) FROM core_ejemplar e WHERE e.titulo_id = core_titulo.id "
+            "AND e.estado = 'PRESTADO')"
+        )
+
+        def _prestamos():
+            for i in range(1, n_p + 1):
+                fecha = hoy - timedelta(days=rnd.randint(0, 5 * 365))
+                if rnd.random() < 0.97:
+                    estado = "DEVUELTO"
+                else:
+                    estado = rnd.choice(["ACTIVO", "ACTIVO", "RENOVADO", "VENCIDO"])
+                    fecha = hoy - timedelta(days=rnd.randint(0, 40))
+                vence = fecha + timedelta(days=rnd.randint(3, 30))
+                yield (i, rnd.randint(1, n_e), "Alumno", str(rnd.randint(30_000_000, 50_000_000)),
+                       fecha.isoformat(), vence.isoformat(), estado)
+
+        db.executemany(
+            "INSERT INTO core_prestamo (id, ejemplar_id, alumno_nombre, alumno_dni, fecha_prestamo, vence, estado) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            _prestamos(),
+        )
+        db.commit()
+
+    def _escenarios(self):
+        """Las mismas queries que arma el ORM en las vistas, traducidas a SQL."""
+        hoy = date.today()
+        abiertos = Prestamo.objects.filter(estado__in=ESTADOS_PRESTAMO_ABIERTOS).values(
+            "alumno_nombre", "ejemplar__titulo__titulo", "vence"
+        ).order_by("vence")
+        qs = {
+            "dashboard · vencen en 7 días": abiertos.filter(vence__gt=hoy, vence__lte=hoy + timedelta(days=7)),
+            "dashboard · atrasados": abiertos.filter(vence__lt=hoy),
+            "dashboard · stock": Ejemplar.objects.order_by().values("estado").annotate(n=Count("id")),
+            "préstamos · última página por fecha": Prestamo.objects.order_by("-fecha_prestamo", "-id")[:50],
+            "préstamos · por estado y vencimiento": Prestamo.objects.filter(estado="VENCIDO").order_by("vence")[:50],
+            "catálogo · disponible de un título": Ejemplar.objects.filter(titulo_id=123, estado="DISPONIBLE")[:1],
+            "catálogo · stock por título": Titulo.objects.filter(id__lte=50).annotate(
+                disponibles_calc=Count("ejemplares", filter=Q(ejemplares__estado="DISPONIBLE")),
+            ).order_by("titulo"),
+        }
+        escenarios = {}
+        for nombre, q in qs.items():
+            sql, params = q.query.sql_with_params()
+            escenarios[nombre] = (sql.replace("%s", "?"), [str(p) if isinstance(p, date) else p for p in params])
+        return escenarios
+
+    def _medir(self, db, escenarios, repeticiones):
+        res = {}
+        for nombre, (sql, params) in escenarios.items():
+            plan = " | ".join(r[-1] for r in db.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+            tiempos = []
+            for _ in range(repeticiones):
+                t0 = time.perf_counter()
+                db.execute(sql, params).fetchall()
+                tiempos.append((time.perf_counter() - t0) * 1000)
+            res[nombre] = {"ms": statistics.median(tiempos), "plan": plan}
+        return res
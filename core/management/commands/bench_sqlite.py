@@ -0,0 +1,163 @@
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+
+from core import prestamos
+from core.models import Titulo, Ejemplar, Prestamo
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark de concurrencia SQLite: tráfico mixto (lecturas de catálogo/stock + "
+        "préstamos y devoluciones) desde varios hilos sobre un archivo temporal, con la "
+        "configuración por defecto y con el perfil de settings.SQLITE_OPTIONS. "
+        "Compara operaciones por segundo y errores 'database is locked'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hilos", type=int, default=8)
+        parser.add_argument("--segundos", type=float, default=10.0, help="Duración de cada corrida.")
+        parser.add_argument("--escrituras", type=float, default=0.2,
+                            help="Fracción de operaciones que son préstamo+devolución (default 0.2).")
+        parser.add_argument("--titulos", type=int, default=2000)
+        parser.add_argument("--prestamos", type=int, default=20_000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "sqlite":
+            raise CommandError("bench_sqlite sólo tiene sentido con el backend SQLite.")
+        if opts["hilos"] < 1 or opts["segundos"] <= 0 or not 0 <= opts["escrituras"] <= 1:
+            raise CommandError("Se necesita --hilos >= 1, --segundos > 0 y --escrituras entre 0 y 1.")
+
+        perfiles = {
+            "por defecto": {},
+            "perfil settings": settings.SQLITE_OPTIONS or {},
+        }
+        if not perfiles["perfil settings"]:
+            self.stdout.write(self.style.WARNING("SQLITE_TUNING está apagado: los dos perfiles son iguales."))
+
+        resultados = {}
+        original = connections.settings["default"]
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                for nombre, options in perfiles.items():
+                    ruta = Path(tmp) / f"bench_{len(resultados)}.sqlite3"
+                    self._usar(dict(original, NAME=str(ruta), OPTIONS=dict(options)))
+                    self._preparar(opts)
+                    resultados[nombre] = self._correr(opts)
+                    self._cerrar()
+        finally:
+            self._usar(original)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n{opts['hilos']} hilos · {opts['segundos']:.0f}s · {opts['escrituras']:.0%} escrituras"
+        ))
+        self.stdout.write(f"{'perfil':<18}{'ops/s':>10}{'lecturas':>10}{'préstamos':>11}{'locked':>8}{'p95 ms':>9}")
+        for nombre, r in resultados.items():
+            self.stdout.write(
+                f"{nombre:<18}{r['ops_s']:>10.0f}{r['lecturas']:>10}{r['escrituras']:>11}"
+                f"{r['locked']:>8}{r['p95_ms']:>9.1f}"
+            )
+        base, nuevo = resultados["por defecto"], resultados["perfil settings"]
+        if base["ops_s"]:
+            self.stdout.write(self.style.SUCCESS(f"Throughput x{nuevo['ops_s'] / base['ops_s']:.2f}"))
+
+    # ---------------------------------------------------------------
+    def _usar(self, settings_dict):
+        """Apunta el alias default a otra base (sólo para este proceso)."""
+        self._cerrar()
+        connections.settings["default"] = settings_dict
+
+    def _cerrar(self):
+        connections.close_all()
+        try:
+            del connections["default"]
+        except AttributeError:
+            pass
+
+    def _preparar(self, opts):
+        call_command("migrate", verbosity=0, interactive=False)
+        call_command("seed_demo", titulos=opts["titulos"], ejemplares=opts["titulos"] * 3,
+                     prestamos=opts["prestamos"], seed=opts["seed"], stdout=StringIO())
+        self._cerrar()
+
+    def _correr(self, opts):
+        titulo_ids = list(Titulo.objects.filter(disponibles__gt=0).values_list("id", flat=True))
+        self._cerrar()
+        fin = time.perf_counter() + opts["segundos"]
+        barrera = threading.Barrier(opts["hilos"])
+        lock = threading.Lock()
+        total = {"lecturas": 0, "escrituras": 0, "locked": 0, "tiempos": []}
+
+        def _trabajar(n):
+            rnd = random.Random(opts["seed"] + n)
+            cuenta = {"lecturas": 0, "escrituras": 0, "locked": 0, "tiempos": []}
+            barrera.wait()
+            try:
+                while time.perf_counter() < fin:
+                    t0 = time.perf_counter()
+                    try:
+                        if rnd.random() < opts["escrituras"]:
+                            self._prestar_y_devolver(rnd.choice(titulo_ids))
+                            cuenta["escrituras"] += 1
+                        else:
+                            self._leer(rnd)
+                            cuenta["lecturas"] += 1
+                    except OperationalError as e:
+                        if "locked" not in str(e) and "busy" not in str(e):
+                            raise
+                        cuenta["locked"] += 1
+                        continue
+                    cuenta["tiempos"].append((time.perf_counter() - t0) * 1000)
+            finally:
+                connections.close_all()
+                with lock:
+                    for k in ("lecturas", "escrituras", "locked"):
+                        total[k] += cuenta[k]
+                    total["tiempos"].extend(cuenta["tiempos"])
+
+        hilos = [threading.Thread(target=_trabajar, args=(n,)) for n in range(opts["hilos"])]
+        t0 = time.perf_counter()
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        duracion = time.perf_counter() - t0
+
+        tiempos = sorted(total["tiempos"]) or [0.0]
+        return {
+            "lecturas": total["lecturas"],
+            "escrituras": total["escrituras"],
+            "locked": total["locked"],
+            "ops_s": (total["lecturas"] + total["escrituras"]) / duracion,
+            "p95_ms": tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))],
+        }
+
+    @staticmethod
+    def _leer(rnd):
+        # Lo que hacen el catálogo y el dashboard: una página de títulos con su stock
+        # y los préstamos que vencen pronto.
+        desde = f"{rnd.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')}"
+        list(Titulo.objects.filter(titulo__gte=desde).order_by("titulo")
+             .values_list("id", "titulo", "disponibles", "prestados")[:20])
+        list(Prestamo.objects.filter(estado="VENCIDO").order_by("vence")
+             .values_list("id", "vence")[:20])
+        Ejemplar.objects.filter(estado="PRESTADO").count()
+
+    @staticmethod
+    def _prestar_y_devolver(titulo_id):
+        try:
+            p = prestamos.prestar(alumno="Bench", dni="30111222", titulo_id=titulo_id,
+                                  vence=date.today() + timedelta(days=7))
+        except prestamos.SinEjemplaresDisponibles:
+            return
+        p.marcar_devuelto()
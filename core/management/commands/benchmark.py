@@ -0,0 +1,242 @@
+import csv
+import json
+import math
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from io import StringIO
+from pathlib import Path
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from core import cache_catalogo, metricas
+from core.models import Titulo, Prestamo
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano (p en 0..100)."""
+    orden = sorted(valores)
+    k = max(0, min(len(orden) - 1, math.ceil(p / 100 * len(orden)) - 1))
+    return orden[k]
+
+
+def _dia_habil(d):
+    while d.weekday() in (5, 6):
+        d += timedelta(days=1)
+    return d
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark de vistas y comandos calientes sobre una base de prueba sembrada con seed_demo. "
+        "Reporta p50/p95/p99, queries SQL y pico de memoria por escenario; guarda JSON y, con "
+        "--comparar, falla si algún escenario empeora más allá de --umbral."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--titulos", type=int, default=20_000)
+        parser.add_argument("--ejemplares", type=int, default=60_000)
+        parser.add_argument("--prestamos", type=int, default=200_000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--repeticiones", type=int, default=15)
+        parser.add_argument("--solo", type=str, default=None,
+                            help="Sólo los escenarios cuyo nombre contenga este texto.")
+        parser.add_argument("--salida", type=str, default=None, help="Ruta del JSON de resultados.")
+        parser.add_argument("--comparar", type=str, default=None, help="JSON de una corrida anterior.")
+        parser.add_argument("--umbral", type=float, default=0.25,
+                            help="Empeoramiento tolerado del p50 (0.25 = +25%%) (default 0.25).")
+
+    def handle(self, *args, **opts):
+        if opts["repeticiones"] < 1:
+            raise CommandError("--repeticiones debe ser >= 1.")
+        base = None
+        if opts["comparar"]:
+            try:
+                base = json.loads(Path(opts["comparar"]).read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                raise CommandError(f"No se pudo leer {opts['comparar']}: {e}")
+
+        # Base de prueba aparte (la misma que usa `manage.py test`): nunca toca los datos reales.
+        # DEBUG apagado: que el log de queries no cueste tiempo fuera de la corrida de conteo.
+        setup_test_environment(debug=False)
+        nombre_original = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            t0 = time.perf_counter()
+            call_command("seed_demo", titulos=opts["titulos"], ejemplares=opts["ejemplares"],
+                         prestamos=opts["prestamos"], seed=opts["seed"], stdout=StringIO())
+            self.stdout.write(f"Base sembrada en {time.perf_counter() - t0:.1f}s")
+            with tempfile.TemporaryDirectory() as tmp:
+                resultados = self._correr(self._escenarios(Path(tmp)), opts)
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
+
+        informe = {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "entorno": {"python": platform.python_version(), "django": django.get_version(),
+                        "motor": connection.vendor},
+            "datos": {k: opts[k] for k in ("titulos", "ejemplares", "prestamos", "seed", "repeticiones")},
+            "escenarios": resultados,
+        }
+        self._imprimir(resultados, base)
+        if opts["salida"]:
+            Path(opts["salida"]).write_text(json.dumps(informe, indent=2, ensure_ascii=False), encoding="utf-8")
+            self.stdout.write(f"Resultados → {opts['salida']}")
+
+        if base:
+            regresiones = self._regresiones(resultados, base["escenarios"], opts["umbral"])
+            if regresiones:
+                raise CommandError("Regresiones:\n  " + "\n  ".join(regresiones))
+            self.stdout.write(self.style.SUCCESS(f"Sin regresiones (umbral +{opts['umbral']:.0%})."))
+
+    # ---------------------------------------------------------------
+    def _escenarios(self, tmp: Path):
+        """nombre → (preparar, ejecutar). Sólo se mide `ejecutar`."""
+        client = Client()
+        populares = list(Titulo.objects.order_by("-disponibles").values_list("titulo", flat=True)[:20])
+        vence = _dia_habil(date.today() + timedelta(days=7)).isoformat()
+        contador = iter(range(10**9))
+
+        def nada():
+            pass
+
+        def get(nombre, params=None):
+            def _ejecutar():
+                resp = client.get(reverse(nombre), params or {})
+                if resp.status_code != 200:
+                    raise CommandError(f"{nombre} devolvió {resp.status_code}")
+                if resp.streaming:
+                    for _ in resp.streaming_content:
+                        pass
+                    resp.close()
+            return _ejecutar
+
+        def prestar():
+            titulo = populares[next(contador) % len(populares)]
+            client.post(reverse("prestamo_create"), {
+                "alumno": "Benchmark", "dni": "30111222", "libro": titulo, "fecha_devolucion": vence,
+            })
+
+        def csv_import():
+            ruta = tmp / "import.csv"
+            lote = next(contador)
+            with ruta.open("w", newline="", encoding="utf-8") as f:
+                w = csv.writer(f)
+                w.writerow(["titulo", "autor", "categoria", "stock"])
+                for i in range(2000):
+                    w.writerow([f"Importado {lote}-{i}", "Autor", "", 1 + i % 3])
+            return ruta
+
+        estado = {}
+
+        def preparar_import():
+            estado["csv"] = csv_import()
+
+        def importar():
+            call_command("import_libros", str(estado["csv"]), stdout=StringIO())
+
+        titulos_legado = list(Titulo.objects.order_by("?").values_list("titulo", flat=True)[:500])
+
+        def preparar_backfill():
+            # Préstamos históricos sin ejemplar, como los que dejó la migración del
+            # modelo viejo, y el CSV prestamo_id,titulo del backup (10% sin match).
+            legado = Prestamo.objects.bulk_create([
+                Prestamo(alumno_nombre="Legado", fecha_prestamo=date.today() - timedelta(days=400),
+                         vence=date.today() - timedelta(days=386), estado="DEVUELTO")
+                for _ in range(2000)
+            ])
+            estado["legado"] = ruta = tmp / "legado.csv"
+            with ruta.open("w", newline="", encoding="utf-8") as f:
+                w = csv.writer(f)
+                w.writerow(["prestamo_id", "titulo"])
+                for i, p in enumerate(legado):
+                    w.writerow([p.id, "Perdido" if i % 10 == 0 else titulos_legado[i % len(titulos_legado)].upper()])
+
+        def backfill():
+            call_command("backfill_ejemplares", "--csv", str(estado["legado"]), stdout=StringIO())
+
+        return {
+            "libros_list · página 1": (nada, get("libros_list")),
+            "libros_list · búsqueda": (nada, get("libros_list", {"q": "historia"})),
+            "libros_export · csv": (nada, get("libros_export", {"formato": "csv"})),
+            "dashboard · sin caché": (metricas.invalidar, get("dashboard")),
+            "dashboard · con caché": (nada, get("dashboard")),
+            "prestamos_list · página 1": (nada, get("prestamos_list")),
+            "prestamos_list · vencidos": (nada, get("prestamos_list", {"estado": "VENCIDO", "orden": "vence"})),
+            "prestamo_create · GET": (nada, get("prestamo_create")),
+            "prestamo_create · POST": (nada, prestar),
+            "titulos_disponibles · sin caché": (cache_catalogo.invalidar, get("titulos_disponibles", {"q": "his"})),
+            "import_libros · 2000 filas": (preparar_import, importar),
+            "backfill_ejemplares · 2000 préstamos": (preparar_backfill, backfill),
+        }
+
+    def _correr(self, escenarios, opts):
+        resultados = {}
+        for nombre, (preparar, ejecutar) in escenarios.items():
+            if opts["solo"] and opts["solo"].lower() not in nombre.lower():
+                continue
+            # Corrida de calentamiento: cuenta queries y mide memoria (tracemalloc
+            # enlentece, por eso queda fuera de los tiempos).
+            preparar()
+            reset_queries()
+            tracemalloc.start()
+            with CaptureQueriesContext(connection) as ctx:
+                ejecutar()
+            # Se cuenta ya: cada request nuevo vacía el log de queries (reset_queries).
+            n_queries = len(ctx.captured_queries)
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            tiempos = []
+            for _ in range(opts["repeticiones"]):
+                preparar()
+                t0 = time.perf_counter()
+                ejecutar()
+                tiempos.append((time.perf_counter() - t0) * 1000)
+
+            resultados[nombre] = {
+                "p50_ms": round(percentil(tiempos, 50), 3),
+                "p95_ms": round(percentil(tiempos, 95), 3),
+                "p99_ms": round(percentil(tiempos, 99), 3),
+                "media_ms": round(statistics.fmean(tiempos), 3),
+                "queries": n_queries,
+                "memoria_pico_kb": round(pico / 1024, 1),
+            }
+            self.stdout.write(f"  {nombre} ✓")
+        return resultados
+
+    def _imprimir(self, resultados, base):
+        anteriores = base["escenarios"] if base else {}
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n{'escenario':<38}{'p50':>10}{'p95':>10}{'p99':>10}{'queries':>9}{'mem KB':>10}"
+        ))
+        for nombre, r in resultados.items():
+            linea = (f"{nombre:<38}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+                     f"{r['queries']:>9}{r['memoria_pico_kb']:>10.0f}")
+            previo = anteriores.get(nombre)
+            if previo and previo["p50_ms"]:
+                linea += f"   p50 x{r['p50_ms'] / previo['p50_ms']:.2f} vs base"
+            self.stdout.write(linea)
+
+    @staticmethod
+    def _regresiones(actual, base, umbral):
+        malas = []
+        for nombre, r in actual.items():
+            previo = base.get(nombre)
+            if not previo:
+                continue
+            if r["p50_ms"] > previo["p50_ms"] * (1 + umbral):
+                malas.append(f"{nombre}: p50 {previo['p50_ms']:.2f} → {r['p50_ms']:.2f} ms")
+            if r["queries"] > previo["queries"]:
+                malas.append(f"{nombre}: queries {previo['queries']} → {r['queries']}")
+        return malas
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import codigos
+from core.models import Ejemplar
+
+
+class Command(BaseCommand):
+    help = (
+        "Asigna el código generado (EJ + id, ver core/codigos.py) a los ejemplares "
+        "que no tienen. Trabaja por lotes confirmados: si se corta, se vuelve a correr "
+        "y sigue. Las altas normales ya reciben código al guardarse; esto es para "
+        "cargas hechas con bulk_create o SQL directo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=codigos.LOTE,
+                            help=f"Ejemplares por lote (default {codigos.LOTE}).")
+
+    def handle(self, *args, **opts):
+        if opts["lote"] < 1:
+            raise CommandError("--lote debe ser >= 1.")
+
+        total = Ejemplar.objects.filter(codigo__isnull=True).count()
+        self.stdout.write(f"Ejemplares sin código: {total}")
+        t0 = time.perf_counter()
+
+        def _progreso(generados, ultimo_id):
+            self.stdout.write(f"  {generados}/{total} · último id {ultimo_id}")
+
+        generados = codigos.generar(lote=opts["lote"], al_avanzar=_progreso)
+        self.stdout.write(self.style.SUCCESS(
+            f"Códigos generados en {time.perf_counter() - t0:.1f}s → {generados}"
+        ))
@@ -1,9 +1,15 @@
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.db.models import Count
 from core.models import Titulo, Ejemplar, Categoria
+from core import busqueda, cache_catalogo, codigos, metricas, stock
+from core.categorizador import (
+    CANONICAL_CATEGORIES, FALLBACK_CATEGORY, Categorizador, categorizador, normalizar,
+)
 
 from pathlib import Path
 import csv
+import time
 
 # ---------- Config flexible de columnas ----------
 ALIASES = {
@@ -18,49 +24,13 @@ ALIASES = {
 }
 
 # ---------- Categorización ----------
-CANONICAL_CATEGORIES = [
-    "Psicología",
-    "Social",
-    "Adolescencia/Niñez",
-    "Teología",
-    "Ética",
-    "Naturaleza",
-    "Informática",
-    "Género",
-    "Adicciones",
-    "Trabajo",
-    "Técnicas y Metodologías",
-    "Investigación/Análisis",
-]
-
-KEYWORD_RULES = [
-    (["social", "vida", "grupo", "sociales", "sociologia", "sociología", "comunidad", "individuo", "equipo", "familiar", "modelos", "edi"], "Social"),
-    (["psicologia", "salud mental", "psicología", "clinica", "clínica", "terapia", "emocional"], "Psicología"),
-    (["adolescencia", "adolescente", "juvenil", "infantil", "adopcion", "niñez", "ninez", "niños", "ninos"], "Adolescencia/Niñez"),
-    (["género", "genero", "mujeres", "esi", "femeninas"], "Género"),
-    (["teologia", "teología"], "Teología"),
-    (["ética", "etica"], "Ética"),
-    (["naturaleza"], "Naturaleza"),
-    (["informatica", "informática"], "Informática"),
-    (["drogas", "consumo"], "Adicciones"),
-    (["laboral", "práctica", "practica", "trabajo"], "Trabajo"),
-    (["metodologico", "metodologica", "tecnica", "técnica", "tecnicas", "metodos", "metodologicos", "elementos"], "Técnicas y Metodologías"),
-    (["investigacion", "análisis", "analisis", "teorias", "teorías"], "Investigación/Análisis"),
-]
-
-FALLBACK_CATEGORY = "Otros"
+# CANONICAL_CATEGORIES, KEYWORD_RULES y FALLBACK_CATEGORY viven en core.categorizador
+# (compartidos con el alta de libros y el admin).
 
 
 # ---------- Utils ----------
 def _norm_text(s: str) -> str:
-    s = (s or "").strip().lower()
-    for a, b in (
-        ("á", "a"), ("é", "e"), ("í", "i"), ("ó", "o"), ("ú", "u"),
-        ("ä", "a"), ("ë", "e"), ("ï", "i"), ("ö", "o"), ("ü", "u"),
-        ("ñ", "n"),
-    ):
-        s = s.replace(a, b)
-    return " ".join(s.split())
+    return normalizar(s)
 
 
 def norm_str(x):
@@ -85,15 +55,9 @@ def map_headers(fieldnames):
 def categoria_por_keywords(*textos: str) -> str | None:
     """
     Recorre KEYWORD_RULES en orden y devuelve la primera categoría canónica que matchee.
+    Usa el categorizador compilado compartido (keywords ya normalizadas).
     """
-    hay = _norm_text(" ".join([t for t in textos if t]))
-    if not hay:
-        return None
-    for keywords, cat in KEYWORD_RULES:
-        for kw in keywords:
-            if _norm_text(kw) in hay:
-                return cat
-    return None
+    return categorizador().categoria(*textos)
 
 
 def parse_stock(value) -> int:
@@ -112,7 +76,10 @@ def parse_stock(value) -> int:
 
 # ---------- Comando principal ----------
 class Command(BaseCommand):
-    help = "Importa títulos desde CSV (sin pandas). Mapea columnas flexible, asigna categorías y crea ejemplares (stock)."
+    help = (
+        "Importa títulos desde CSV (sin pandas). Mapea columnas flexible, asigna categorías y crea ejemplares (stock). "
+        "Procesa las filas en lotes con escrituras masivas (bulk_create/bulk_update)."
+    )
 
     def add_arguments(self, parser):
         parser.add_argument("path", type=str, help="Ruta al .csv (UTF-8).")
@@ -121,6 +88,7 @@ class Command(BaseCommand):
         parser.add_argument("--delimiter", type=str, default=None, help="Delimitador (auto si no se indica).")
         parser.add_argument("--header-row", type=int, default=1, help="Número de fila donde está la cabecera (1 = primera).")
         parser.add_argument("--debug", action="store_true", help="Muestra encabezados detectados y mapeo.")
+        parser.add_argument("--lote", type=int, default=1000, help="Filas por lote de escritura (default: 1000).")
         # Overrides manuales
         parser.add_argument("--col-titulo", type=str, default=None)
         parser.add_argument("--col-autor", type=str, default=None)
@@ -194,11 +162,16 @@ class Command(BaseCommand):
                     Titulo.objects.all().delete()
                 self.stdout.write(self.style.WARNING("Se borraron TODOS los títulos y ejemplares (limpieza previa)."))
 
-            creados_t = actualizados_t = nuevos_ej = 0
+            cont = {"creados_t": 0, "actualizados_t": 0, "nuevos_ej": 0, "filas": 0}
             filas_sin_titulo = 0
+            lote_n = max(1, int(opts.get("lote") or 1000))
+            self._cats = {}
+            cat_engine = Categorizador()  # keywords normalizadas y compiladas una sola vez
+            inicio = time.perf_counter()
 
-            # --- Proceso principal ---
+            # --- Proceso principal: filas parseadas en lotes, escritura set-based ---
             with transaction.atomic():
+                lote = []
                 for row in reader:
                     titulo_txt = norm_str(row.get(col_titulo)) if col_titulo else ""
                     if not titulo_txt:
@@ -210,52 +183,122 @@ class Command(BaseCommand):
                     stock_n = parse_stock(row.get(col_stock)) if col_stock else 1
 
                     # Categoría por keywords si no hay o para normalizar
-                    cat_final = categoria_por_keywords(categoria_raw, titulo_txt) or FALLBACK_CATEGORY
+                    cat_final = cat_engine.categoria(categoria_raw, titulo_txt) or FALLBACK_CATEGORY
                     if cat_final not in CANONICAL_CATEGORIES and cat_final != FALLBACK_CATEGORY:
                         cat_final = FALLBACK_CATEGORY
 
-                    if opts["dry_run"]:
-                        # Simulación de creación/actualización
-                        if Titulo.objects.filter(titulo=titulo_txt).exists():
-                            actualizados_t += 1
-                        else:
-                            creados_t += 1
-                            nuevos_ej += max(1, stock_n)
-                        continue
+                    lote.append((titulo_txt, autor_txt, cat_final, stock_n))
+                    if len(lote) >= lote_n:
+                        self._procesar_lote(lote, opts["dry_run"], cont)
+                        lote = []
+                if lote:
+                    self._procesar_lote(lote, opts["dry_run"], cont)
 
-                    # ----- Escritura real -----
-                    titulo_obj, created = Titulo.objects.get_or_create(
-                        titulo=titulo_txt,
-                        defaults={"autor": autor_txt}
-                    )
-                    if not created:
-                        # actualizar autor si vino y cambió
-                        if autor_txt and autor_txt != titulo_obj.autor:
-                            titulo_obj.autor = autor_txt
-                            titulo_obj.save(update_fields=["autor"])
-                        actualizados_t += 1
-                    else:
-                        creados_t += 1
-
-                    # Categorías: asegurar cat_final
-                    cat_objs = []
-                    for c in [cat_final]:
-                        cat_obj, _ = Categoria.objects.get_or_create(nombre=c)
-                        cat_objs.append(cat_obj)
-                    # set/add sin perder otras si ya tiene
-                    for c in cat_objs:
-                        titulo_obj.categorias.add(c)
-
-                    # Stock / ejemplares
-                    existentes = titulo_obj.ejemplares.count()
-                    a_crear = max(0, stock_n - existentes)
-                    if a_crear > 0:
-                        to_create = [Ejemplar(titulo=titulo_obj, estado="DISPONIBLE") for _ in range(a_crear)]
-                        Ejemplar.objects.bulk_create(to_create)
-                        nuevos_ej += a_crear
+            # bulk_create no dispara señales: refrescamos dashboard y catálogo a mano.
+            metricas.invalidar()
+            cache_catalogo.invalidar()
 
+            segundos = time.perf_counter() - inicio
             pref = "[DRY-RUN] " if opts["dry_run"] else ""
             self.stdout.write(self.style.SUCCESS(
-                f"{pref}Import listo → Títulos creados: {creados_t} · Títulos actualizados: {actualizados_t} · "
-                f"Ejemplares nuevos: {nuevos_ej} · Filas sin título: {filas_sin_titulo}"
+                f"{pref}Import listo → Títulos creados: {cont['creados_t']} · Títulos actualizados: {cont['actualizados_t']} · "
+                f"Ejemplares nuevos: {cont['nuevos_ej']} · Filas sin título: {filas_sin_titulo}"
             ))
+            self.stdout.write(
+                f"{pref}Rendimiento → {cont['filas']} filas en {segundos:.2f}s "
+                f"({cont['filas'] / segundos if segundos else 0:,.0f} filas/s, lotes de {lote_n})"
+            )
+
+    # ---------- Lotes ----------
+    def _categorias(self, nombres):
+        """Devuelve {nombre: id}, creando las que falten (cacheadas entre lotes)."""
+        faltan = set(nombres) - self._cats.keys()
+        if faltan:
+            Categoria.objects.bulk_create([Categoria(nombre=n) for n in faltan], ignore_conflicts=True)
+            self._cats.update(Categoria.objects.filter(nombre__in=faltan).values_list("nombre", "id"))
+        return self._cats
+
+    def _procesar_lote(self, lote, dry, cont):
+        """
+        Un lote de filas → un puñado de queries:
+        1 SELECT de títulos existentes (IN), bulk_create/bulk_update de títulos,
+        bulk_create de vínculos M2M y de ejemplares, 1 agregado de stock actual.
+        """
+        cont["filas"] += len(lote)
+        nombres = {t for t, _, _, _ in lote}
+        existentes = {
+            t.titulo: t for t in Titulo.objects.filter(titulo__in=nombres).only("id", "titulo", "autor")
+        }
+
+        if dry:
+            # Simulación de creación/actualización
+            for titulo_txt, _, _, stock_n in lote:
+                if titulo_txt in existentes:
+                    cont["actualizados_t"] += 1
+                else:
+                    cont["creados_t"] += 1
+                    cont["nuevos_ej"] += max(1, stock_n)
+            return
+
+        # Consolidar filas repetidas del lote: último autor no vacío, todas las
+        # categorías y el stock mayor (lo mismo que hacía el alta fila por fila).
+        por_titulo = {}
+        for titulo_txt, autor_txt, cat_final, stock_n in lote:
+            d = por_titulo.get(titulo_txt)
+            if d is None:
+                por_titulo[titulo_txt] = {"autor": autor_txt, "cats": {cat_final}, "stock": stock_n, "filas": 1}
+                continue
+            if autor_txt:
+                d["autor"] = autor_txt
+            d["cats"].add(cat_final)
+            d["stock"] = max(d["stock"], stock_n)
+            d["filas"] += 1
+
+        nuevos, a_actualizar = [], []
+        for titulo_txt, d in por_titulo.items():
+            t = existentes.get(titulo_txt)
+            if t is None:
+                nuevos.append(Titulo(titulo=titulo_txt, autor=d["autor"]))
+                cont["creados_t"] += 1
+                cont["actualizados_t"] += d["filas"] - 1
+            else:
+                # actualizar autor si vino y cambió
+                if d["autor"] and d["autor"] != t.autor:
+                    t.autor = d["autor"]
+                    a_actualizar.append(t)
+                cont["actualizados_t"] += d["filas"]
+
+        if nuevos:
+            Titulo.objects.bulk_create(nuevos)
+        if a_actualizar:
+            Titulo.objects.bulk_update(a_actualizar, ["autor"])
+
+        ids = dict(Titulo.objects.filter(titulo__in=por_titulo.keys()).values_list("titulo", "id"))
+
+        # Categorías: asegurar cat_final sin perder otras si ya tiene
+        cats = self._categorias({c for d in por_titulo.values() for c in d["cats"]})
+        through = Titulo.categorias.through
+        through.objects.bulk_create(
+            [through(titulo_id=ids[t], categoria_id=cats[c]) for t, d in por_titulo.items() for c in d["cats"]],
+            ignore_conflicts=True,
+        )
+
+        # Stock / ejemplares
+        actuales = dict(
+            Ejemplar.objects.filter(titulo_id__in=ids.values())
+            .order_by().values("titulo_id").annotate(n=Count("id")).values_list("titulo_id", "n")
+        )
+        to_create = []
+        for titulo_txt, d in por_titulo.items():
+            tid = ids[titulo_txt]
+            a_crear = max(0, d["stock"] - actuales.get(tid, 0))
+            to_create += [Ejemplar(titulo_id=tid, estado="DISPONIBLE") for _ in range(a_crear)]
+        if to_create:
+            Ejemplar.objects.bulk_create(to_create, batch_size=1000)
+            codigos.generar()  # bulk_create no pasa por Ejemplar.save()
+            cont["nuevos_ej"] += len(to_create)
+            # Contadores de stock del lote en un solo UPDATE.
+            stock.recalcular({e.titulo_id for e in to_create})
+
+        # bulk_create/bulk_update no disparan señales: índice de búsqueda a mano.
+        busqueda.reindexar([t.pk for t in a_actualizar] + [ids[t.titulo] for t in nuevos])
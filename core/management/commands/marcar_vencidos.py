@@ -0,0 +1,35 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import metricas, vencimientos
+
+
+class Command(BaseCommand):
+    help = (
+        "Pasa a VENCIDO los préstamos ACTIVO/RENOVADO con vencimiento anterior a hoy, "
+        "en UPDATEs por lotes. Idempotente: pensado para correr a diario (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=vencimientos.LOTE,
+                            help=f"Filas por UPDATE (default {vencimientos.LOTE}).")
+        parser.add_argument("--fecha", type=str, default=None,
+                            help="Fecha de corte YYYY-MM-DD (default: hoy).")
+
+    def handle(self, *args, **opts):
+        try:
+            hoy = date.fromisoformat(opts["fecha"]) if opts["fecha"] else date.today()
+        except ValueError:
+            raise CommandError("--fecha debe tener formato YYYY-MM-DD.")
+        if opts["lote"] < 1:
+            raise CommandError("--lote debe ser >= 1.")
+
+        t0 = time.perf_counter()
+        marcados = vencimientos.marcar_vencidos(hoy, lote=opts["lote"])
+        if marcados:
+            metricas.invalidar()
+        self.stdout.write(self.style.SUCCESS(
+            f"Préstamos marcados VENCIDO al {hoy}: {marcados} ({time.perf_counter() - t0:.2f}s)"
+        ))
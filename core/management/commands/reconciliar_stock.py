@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import metricas, stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara los contadores de stock de cada título (disponibles/prestados) con sus "
+        "ejemplares reales. Con --reparar los recalcula."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reparar", action="store_true", help="Corrige los títulos con desvío.")
+        parser.add_argument("--todos", action="store_true", help="Recalcula todos los títulos, no sólo los desviados.")
+        parser.add_argument("--mostrar", type=int, default=20, help="Cuántos desvíos listar (default 20).")
+
+    def handle(self, *args, **opts):
+        if opts["todos"]:
+            with transaction.atomic():
+                n = stock.recalcular()
+            metricas.invalidar()
+            self.stdout.write(self.style.SUCCESS(f"Contadores recalculados → títulos: {n}"))
+            return
+
+        desvios = list(
+            stock.desvios().values_list("id", "titulo", "disponibles", "prestados",
+                                        "real_disponibles", "real_prestados")
+        )
+        if not desvios:
+            self.stdout.write(self.style.SUCCESS("Sin desvíos: los contadores coinciden con los ejemplares."))
+            return
+
+        self.stdout.write(self.style.WARNING(f"Títulos con desvío: {len(desvios)}"))
+        for tid, titulo, disp, pres, real_disp, real_pres in desvios[:opts["mostrar"]]:
+            self.stdout.write(f"  #{tid} {titulo!r}: disponibles {disp}→{real_disp}, prestados {pres}→{real_pres}")
+
+        if opts["reparar"]:
+            with transaction.atomic():
+                n = stock.recalcular(d[0] for d in desvios)
+            metricas.invalidar()
+            self.stdout.write(self.style.SUCCESS(f"Reparados: {n}"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import busqueda
+from core.models import Titulo
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de búsqueda de texto completo (títulos y autores)."
+
+    def handle(self, *args, **opts):
+        b = busqueda.backend()
+        with transaction.atomic():
+            b.crear_indice()
+            b.reindexar()
+        self.stdout.write(self.style.SUCCESS(
+            f"Índice de búsqueda reconstruido ({b.__class__.__name__}) → títulos: {Titulo.objects.count()}"
+        ))
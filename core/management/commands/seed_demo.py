@@ -1,9 +1,15 @@
-from django.core.management.base import BaseCommand
-from django.db import transaction
-from django.utils import timezone
-from core.models import Libro, Prestamo
 import random
+import time
+from array import array
+from bisect import bisect_right
 from datetime import date, timedelta
+from itertools import accumulate, islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core import busqueda, cache_catalogo, codigos, metricas, stock
+from core.models import Titulo, Ejemplar, Prestamo, PrestamoArchivado, Categoria, ensure_categoria_otros
 
 CATEGORIAS = [
     "Ciencia", "Psicología", "Social", "Historia", "Literatura",
@@ -22,86 +28,213 @@ ALUMNOS = [
     "Micaela Cortina", "Pilar Romero", "Tomás Castro", "Agustina Reyes",
 ]
 
-def gen_titulo(i):
-    base = ["El secreto de", "Introducción a", "Manual de", "Teoría de",
-            "Breve historia de", "Fundamentos de", "El arte de", "La esencia de"]
-    tema = ["la mente", "las palabras", "la física", "la sociedad",
-            "la educación", "los algoritmos", "la historia", "la lectura"]
-    return f"{random.choice(base)} {random.choice(tema)} #{i}"
+BASES = ["El secreto de", "Introducción a", "Manual de", "Teoría de",
+         "Breve historia de", "Fundamentos de", "El arte de", "La esencia de"]
+TEMAS = ["la mente", "las palabras", "la física", "la sociedad",
+         "la educación", "los algoritmos", "la historia", "la lectura"]
+
+PLAZO_DIAS = 14          # plazo normal de un préstamo
+HISTORIA_DIAS = 2 * 365  # los préstamos devueltos se reparten en los últimos 2 años
+
+
+def gen_titulo(rnd, i):
+    return f"{rnd.choice(BASES)} {rnd.choice(TEMAS)} #{i}"
+
+
+def en_lotes(iterable, n):
+    it = iter(iterable)
+    while lote := list(islice(it, n)):
+        yield lote
+
 
 class Command(BaseCommand):
-    help = "Crea N libros de demo y (opcional) M préstamos repartidos (algunos atrasados, otros próximos)."
+    help = (
+        "Genera datos sintéticos reproducibles (títulos, ejemplares, préstamos) con bulk_create "
+        "por lotes. Popularidad tipo Zipf: pocos títulos concentran ejemplares y préstamos; "
+        "préstamos abiertos con cola de atrasados y renovaciones, más historial devuelto. "
+        "Escala a millones de filas para los benchmarks."
+    )
 
     def add_arguments(self, parser):
-        parser.add_argument("--n", type=int, default=40, help="Cantidad de libros a crear (default: 40)")
-        parser.add_argument("--prestamos", type=int, default=15, help="Cantidad de préstamos de demo a crear (default: 15)")
+        parser.add_argument("--titulos", "--n", dest="titulos", type=int, default=40,
+                            help="Cantidad de títulos a crear (default: 40)")
+        parser.add_argument("--ejemplares", type=int, default=None,
+                            help="Cantidad total de ejemplares (default: 3 por título)")
+        parser.add_argument("--prestamos", type=int, default=15,
+                            help="Cantidad total de préstamos, abiertos + historial (default: 15)")
+        parser.add_argument("--abiertos", type=float, default=0.1,
+                            help="Fracción de ejemplares con un préstamo abierto (default: 0.1)")
+        parser.add_argument("--zipf", type=float, default=1.1,
+                            help="Exponente de popularidad; 0 = uniforme (default: 1.1)")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--lote", type=int, default=5000, help="Filas por bulk_create (default: 5000)")
         parser.add_argument("--limpiar", action="store_true",
-                            help="Borra Libros y Prestamos antes de sembrar (cuidado: elimina datos).")
+                            help="Borra títulos, ejemplares y préstamos antes de sembrar (cuidado: elimina datos).")
 
-    @transaction.atomic
     def handle(self, *args, **opts):
-        n = opts["n"]
-        m = opts["prestamos"]
-        limpiar = opts["limpiar"]
-
-        if limpiar:
-            Prestamo.objects.all().delete()
-            Libro.objects.all().delete()
-            self.stdout.write(self.style.WARNING("Se limpiaron Libros y Prestamos."))
-
-     
-        creados = 0
-        for i in range(1, n + 1):
-            titulo = gen_titulo(i)
-            autor = random.choice(AUTORES)
-            categoria = random.choice(CATEGORIAS)
-            estado = "Disponible"  
-
-            obj, ok = Libro.objects.get_or_create(
-                titulo=titulo,
-                defaults={"autor": autor, "categoria": categoria, "estado": estado}
-            )
-            if ok:
-                creados += 1
-
-        self.stdout.write(self.style.SUCCESS(f"Libros creados: {creados} (de {n} pedidos)."))
-
- 
-        libros_disponibles = list(Libro.objects.filter(estado="Disponible"))
-        random.shuffle(libros_disponibles)
-        m = min(m, len(libros_disponibles))  
+        n_t = opts["titulos"]
+        n_e = opts["ejemplares"] if opts["ejemplares"] is not None else 3 * n_t
+        n_p = opts["prestamos"]
+        lote = opts["lote"]
+        if n_t < 1 or n_e < n_t or n_p < 0 or lote < 1:
+            raise CommandError("Se necesita --titulos >= 1, --ejemplares >= --titulos, --prestamos >= 0 y --lote >= 1.")
+        if not 0 <= opts["abiertos"] <= 1:
+            raise CommandError("--abiertos es una fracción entre 0 y 1.")
+
+        rnd = random.Random(opts["seed"])
         hoy = date.today()
-
-        creados_p = 0
-        for i in range(m):
-            libro = libros_disponibles[i]
-            alumno = random.choice(ALUMNOS)
-            dni = str(random.randint(30000000, 50000000))
-
-      
-            delta_vence = random.randint(-5, 10)
-            vence = hoy + timedelta(days=delta_vence)
-
-        
-            p = Prestamo.objects.create(
-                alumno=alumno,
-                dni=dni,
-                libro=libro,
-                vence=vence,
-                devuelto=False
-            )
-   
-            try:
-                days_back = random.randint(0, 14)
-                fecha_p = hoy - timedelta(days=days_back)
-                Prestamo.objects.filter(pk=p.pk).update(fecha_prestamo=fecha_p)
-            except Exception:
-                pass 
-
-          
-            libro.estado = "Prestado"
-            libro.save(update_fields=["estado"])
-            creados_p += 1
-
-        self.stdout.write(self.style.SUCCESS(f"Préstamos creados: {creados_p} (activos)."))
-        self.stdout.write(self.style.SUCCESS("Seed de demo completo."))
+        t0 = time.perf_counter()
+
+        if opts["limpiar"]:
+            self._limpiar()
+            self.stdout.write(self.style.WARNING("Se limpiaron títulos, ejemplares y préstamos."))
+
+        # Popularidad: el título de rango r pesa 1/r^s. Se baraja para que el
+        # rango no coincida con el orden alfabético ni con el id.
+        pesos = [1 / (r ** opts["zipf"]) for r in range(1, n_t + 1)]
+        rnd.shuffle(pesos)
+        acumulados = list(accumulate(pesos))
+
+        titulo_ids = self._crear_titulos(rnd, n_t, lote)
+        self._log("títulos", len(titulo_ids), t0)
+
+        # Ejemplares por título: 1 fijo + el resto repartido por popularidad.
+        copias = [1] * n_t
+        for i in rnd.choices(range(n_t), cum_weights=acumulados, k=n_e - n_t):
+            copias[i] += 1
+
+        # Préstamos abiertos: también por popularidad, sin pasar de las copias del título.
+        abiertos = [0] * n_t
+        n_abiertos = min(round(n_e * opts["abiertos"]), n_p)
+        asignados = 0
+        for _ in range(5):
+            for i in rnd.choices(range(n_t), cum_weights=acumulados, k=n_abiertos - asignados):
+                if abiertos[i] < copias[i] and asignados < n_abiertos:
+                    abiertos[i] += 1
+                    asignados += 1
+        # Si los populares ya están agotados, lo que falte va en orden.
+        for i in range(n_t):
+            extra = min(copias[i] - abiertos[i], n_abiertos - asignados)
+            abiertos[i] += extra
+            asignados += extra
+
+        ejemplar_ids, offsets = self._crear_ejemplares(titulo_ids, copias, abiertos, lote)
+        self._log("ejemplares", len(ejemplar_ids), t0)
+
+        def _abiertos():
+            for i, n in enumerate(abiertos):
+                for k in range(n):
+                    yield self._prestamo_abierto(rnd, hoy, ejemplar_ids[offsets[i] + k])
+
+        def _historial():
+            for _ in range(n_p - n_abiertos):
+                i = bisect_right(acumulados, rnd.random() * acumulados[-1])
+                ej_id = ejemplar_ids[offsets[i] + rnd.randrange(copias[i])]
+                yield self._prestamo_devuelto(rnd, hoy, ej_id)
+
+        n_prest = 0
+        for gen in (_abiertos(), _historial()):
+            for filas in en_lotes(gen, lote):
+                with transaction.atomic():
+                    Prestamo.objects.bulk_create(filas, batch_size=lote)
+                n_prest += len(filas)
+        self._log("préstamos", n_prest, t0)
+
+        with transaction.atomic():
+            stock.recalcular(titulo_ids)
+            busqueda.reindexar(titulo_ids)
+        metricas.invalidar()
+        self.stdout.write(self.style.SUCCESS(
+            f"Seed completo en {time.perf_counter() - t0:.1f}s (seed={opts['seed']}): "
+            f"{len(titulo_ids)} títulos, {len(ejemplar_ids)} ejemplares, {n_prest} préstamos "
+            f"({n_abiertos} abiertos)."
+        ))
+
+    # ---------------------------------------------------------------
+    def _log(self, que, n, t0):
+        self.stdout.write(f"  {que:>11}: {n:>10}  ({time.perf_counter() - t0:.1f}s)")
+
+    def _limpiar(self):
+        # DELETE directos: con millones de filas el borrado en cascada del ORM
+        # (que además dispara señales fila por fila) no termina más.
+        tablas = [PrestamoArchivado._meta.db_table, Prestamo._meta.db_table, Ejemplar._meta.db_table,
+                  Titulo.categorias.through._meta.db_table, Titulo._meta.db_table]
+        with transaction.atomic(), connection.cursor() as cur:
+            for tabla in tablas:
+                cur.execute(f"DELETE FROM {connection.ops.quote_name(tabla)}")
+            busqueda.reindexar()
+        metricas.invalidar()
+        cache_catalogo.invalidar()
+
+    def _crear_titulos(self, rnd, n_t, lote) -> list[int]:
+        cats = [Categoria.objects.get_or_create(nombre=n)[0].id for n in CATEGORIAS]
+        ensure_categoria_otros()
+        through = Titulo.categorias.through
+        # El sufijo parte del id máximo para no chocar con el unique de títulos previos.
+        inicio = (Titulo.objects.order_by("-id").values_list("id", flat=True).first() or 0) + 1
+        anio_max = date.today().year
+
+        ids = []
+        for desde in range(0, n_t, lote):
+            hasta = min(desde + lote, n_t)
+            with transaction.atomic():
+                titulos = Titulo.objects.bulk_create([
+                    Titulo(titulo=gen_titulo(rnd, inicio + i), autor=rnd.choice(AUTORES),
+                           anio=str(rnd.randint(1950, anio_max)))
+                    for i in range(desde, hasta)
+                ], batch_size=lote)
+                vinculos = []
+                for t in titulos:
+                    for c in rnd.sample(cats, 1 if rnd.random() < 0.8 else 2):
+                        vinculos.append(through(titulo_id=t.id, categoria_id=c))
+                through.objects.bulk_create(vinculos, batch_size=lote)
+            ids.extend(t.id for t in titulos)
+        return ids
+
+    def _crear_ejemplares(self, titulo_ids, copias, abiertos, lote):
+        """
+        Crea los ejemplares título por título (los prestados primero) y
+        devuelve sus ids en un array plano + el offset de cada título.
+        """
+        ids = array("q")
+        offsets = array("q")
+
+        def _filas():
+            for tid, n, prestados in zip(titulo_ids, copias, abiertos):
+                for k in range(n):
+                    yield Ejemplar(titulo_id=tid, estado="PRESTADO" if k < prestados else "DISPONIBLE")
+
+        pos = 0
+        for n in copias:
+            offsets.append(pos)
+            pos += n
+        for filas in en_lotes(_filas(), lote):
+            with transaction.atomic():
+                Ejemplar.objects.bulk_create(filas, batch_size=lote)
+            ids.extend(e.id for e in filas)
+        codigos.generar(lote=lote)  # bulk_create no pasa por Ejemplar.save()
+        return ids, offsets
+
+    def _alumno(self, rnd):
+        return rnd.choice(ALUMNOS), str(rnd.randint(30_000_000, 50_000_000))
+
+    def _prestamo_abierto(self, rnd, hoy, ejemplar_id):
+        nombre, dni = self._alumno(rnd)
+        # Antigüedad exponencial: la mayoría recientes, cola larga de atrasados.
+        fecha = hoy - timedelta(days=min(int(rnd.expovariate(1 / 10)), 180))
+        vence = fecha + timedelta(days=PLAZO_DIAS)
+        estado = "ACTIVO"
+        if rnd.random() < 0.2:
+            vence += timedelta(days=7 * rnd.randint(1, 2))
+            estado = "RENOVADO"
+        if vence < hoy:
+            estado = "VENCIDO"
+        return Prestamo(ejemplar_id=ejemplar_id, alumno_nombre=nombre, alumno_dni=dni,
+                        fecha_prestamo=fecha, vence=vence, estado=estado)
+
+    def _prestamo_devuelto(self, rnd, hoy, ejemplar_id):
+        nombre, dni = self._alumno(rnd)
+        fecha = hoy - timedelta(days=rnd.randint(PLAZO_DIAS, HISTORIA_DIAS))
+        vence = fecha + timedelta(days=PLAZO_DIAS)
+        return Prestamo(ejemplar_id=ejemplar_id, alumno_nombre=nombre, alumno_dni=dni,
+                        fecha_prestamo=fecha, vence=vence, estado="DEVUELTO")
@@ -0,0 +1,124 @@
+"""
+Métricas del dashboard (stock, ocupación, vencimientos) con caché.
+
+El stock sale de una sola query con agregados condicionales y todo el
+resultado queda en caché hasta que cambie un Ejemplar o un Prestamo
+(ver core/signals.py) o cambie el día. Los atrasados son los préstamos en
+estado VENCIDO (los marca el comando `marcar_vencidos`, ver
+core/vencimientos.py) más los abiertos que vencieron desde el último
+barrido; el dashboard no escribe.
+"""
+import asyncio
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import Ejemplar, Prestamo, ESTADOS_PRESTAMO_ABIERTOS
+from .vencimientos import ESTADOS_A_VENCER
+
+CACHE_KEY = "dashboard:metricas"
+
+
+AGREGADOS_STOCK = {
+    "total": Count("id"),
+    "prestados": Count("id", filter=Q(estado="PRESTADO")),
+    "disponibles": Count("id", filter=Q(estado="DISPONIBLE")),
+}
+
+
+def _con_ocupacion(agg: dict) -> dict:
+    total = agg["total"]
+    agg["ocupacion"] = round((agg["prestados"] / total) * 100, 1) if total else 0
+    return agg
+
+
+def resumen_stock() -> dict:
+    """Total / prestados / disponibles / ocupación en una sola query."""
+    return _con_ocupacion(Ejemplar.objects.order_by().aggregate(**AGREGADOS_STOCK))
+
+
+def _consultas_vencimientos(hoy: date):
+    """(vencen en 7 días, atrasados) como querysets sin evaluar."""
+    base = (
+        Prestamo.objects
+        .values("alumno_nombre", "ejemplar__titulo__titulo", "vence")
+        .order_by("vence")
+    )
+    vence_7d_qs = base.filter(
+        estado__in=ESTADOS_PRESTAMO_ABIERTOS,  # mismo predicado que el índice parcial
+        vence__gt=hoy, vence__lte=hoy + timedelta(days=7),
+    )
+    # VENCIDO + los abiertos que vencieron desde el último barrido: no depende
+    # de cuándo corrió marcar_vencidos. Las dos ramas usan el índice (estado, vence).
+    atrasados_qs = base.filter(Q(estado="VENCIDO") | Q(estado__in=ESTADOS_A_VENCER, vence__lt=hoy))
+    return vence_7d_qs, atrasados_qs
+
+
+def _fmt(d) -> dict:
+    return {"alumno": d["alumno_nombre"], "libro": d["ejemplar__titulo__titulo"], "vence": d["vence"]}
+
+
+def _vencimientos(hoy: date) -> tuple[list, list]:
+    vence_7d_qs, atrasados_qs = _consultas_vencimientos(hoy)
+    return [_fmt(d) for d in vence_7d_qs], [_fmt(d) for d in atrasados_qs]
+
+
+def _armar(hoy, stock, vence_7d, atrasados) -> dict:
+    datos = {
+        "hoy": hoy,
+        "total": stock["total"],
+        "prestados": stock["prestados"],
+        "disponibles": stock["disponibles"],
+        "ocupacion": stock["ocupacion"],
+        "vence_7d": vence_7d,
+        "atrasados": atrasados,
+    }
+    cache.set(CACHE_KEY, datos, getattr(settings, "DASHBOARD_CACHE_SEGUNDOS", 300))
+    return datos
+
+
+def _en_cache(hoy: date):
+    # Sólo lectura: el estado VENCIDO lo mantiene el comando marcar_vencidos (cron).
+    datos = cache.get(CACHE_KEY)
+    return datos if datos and datos.get("hoy") == hoy else None
+
+
+def metricas_dashboard(hoy: date | None = None) -> dict:
+    hoy = hoy or date.today()
+    datos = _en_cache(hoy)
+    if datos:
+        return datos
+    vence_7d, atrasados = _vencimientos(hoy)
+    return _armar(hoy, resumen_stock(), vence_7d, atrasados)
+
+
+# -------------------------------------------------------------------
+# Versión async (core/views_async.py)
+# -------------------------------------------------------------------
+async def _alista(qs) -> list:
+    return [_fmt(d) async for d in qs.aiterator()]
+
+
+async def ametricas_dashboard(hoy: date | None = None) -> dict:
+    """
+    Igual que metricas_dashboard, con el ORM async: el agregado de stock y
+    las dos listas de vencimientos se lanzan juntas con asyncio.gather.
+    """
+    hoy = hoy or date.today()
+    datos = await sync_to_async(_en_cache)(hoy)
+    if datos:
+        return datos
+    vence_7d_qs, atrasados_qs = _consultas_vencimientos(hoy)
+    agg, vence_7d, atrasados = await asyncio.gather(
+        Ejemplar.objects.order_by().aaggregate(**AGREGADOS_STOCK),
+        _alista(vence_7d_qs),
+        _alista(atrasados_qs),
+    )
+    return await sync_to_async(_armar)(hoy, _con_ocupacion(agg), vence_7d, atrasados)
+
+
+def invalidar():
+    cache.delete(CACHE_KEY)
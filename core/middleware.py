@@ -0,0 +1,154 @@
+"""
+Instrumentación SQL por request.
+
+`InstrumentacionSQLMiddleware` mide cada query con un execute_wrapper
+(funciona con DEBUG=False, no depende de connection.queries) y por request
+registra:
+- cantidad de queries y tiempo total en la DB,
+- la sentencia más lenta,
+- sentencias repetidas (mismo SQL y mismos parámetros: olor a N+1).
+
+El resultado sale en el header `Server-Timing` (lo muestran las devtools
+del navegador) y en una línea de log JSON en el logger "core.sql". Si la
+vista tiene presupuesto en settings.SQL_PRESUPUESTOS y lo excede, el log
+sale como WARNING y se agrega el header `X-SQL-Presupuesto`.
+
+El wrapper queda instalado en todas las conexiones (`instalar`, desde la
+señal connection_created) y toma el colector del request de un ContextVar.
+Así también cuenta las queries de las vistas async, que el ORM corre en
+otro hilo con su propia conexión (asgiref copia el contexto al saltar).
+
+Las respuestas en streaming (exportación) hacen sus queries después de
+que el middleware devuelve la respuesta: sólo se cuentan las previas.
+"""
+import json
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger("core.sql")
+
+SQL_LOG_MAX = 300  # caracteres de SQL que van al log
+
+
+class ColectorSQL:
+    """execute_wrapper que acumula tiempos y sentencias de un request."""
+
+    def __init__(self):
+        self.cantidad = 0
+        self.total_ms = 0.0
+        self.mas_lenta = (0.0, "")
+        self._firmas = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - t0) * 1000
+            self.cantidad += 1
+            self.total_ms += ms
+            if ms > self.mas_lenta[0]:
+                self.mas_lenta = (ms, sql)
+            if not many:
+                self._firmas[(sql, repr(params))] += 1
+
+    @property
+    def duplicadas(self) -> int:
+        """Ejecuciones de más de sentencias idénticas (SQL + parámetros)."""
+        return sum(n - 1 for n in self._firmas.values() if n > 1)
+
+
+_colector_actual = ContextVar("colector_sql", default=None)
+
+
+def _medir(execute, sql, params, many, context):
+    colector = _colector_actual.get()
+    if colector is None:
+        return execute(sql, params, many, context)
+    return colector(execute, sql, params, many, context)
+
+
+def instalar(connection, **kwargs):
+    """Receptor de connection_created: deja `_medir` en la conexión (una vez)."""
+    if _medir not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir)
+
+
+class InstrumentacionSQLMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Conexiones que ya estaban abiertas antes de conectar la señal.
+        for conn in connections.all(initialized_only=True):
+            instalar(conn)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, "SQL_INSTRUMENTACION", True):
+            return self.get_response(request)
+
+        colector = ColectorSQL()
+        token = _colector_actual.set(colector)
+        t0 = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _colector_actual.reset(token)
+        return self._registrar(request, response, colector, t0)
+
+    async def __acall__(self, request):
+        if not getattr(settings, "SQL_INSTRUMENTACION", True):
+            return await self.get_response(request)
+
+        colector = ColectorSQL()
+        token = _colector_actual.set(colector)
+        t0 = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _colector_actual.reset(token)
+        return self._registrar(request, response, colector, t0)
+
+    def _registrar(self, request, response, colector, t0):
+        total_ms = (time.perf_counter() - t0) * 1000
+
+        match = getattr(request, "resolver_match", None)
+        vista = match.url_name if match else None
+        presupuesto = getattr(settings, "SQL_PRESUPUESTOS", {}).get(vista)
+        excedido = presupuesto is not None and colector.cantidad > presupuesto
+
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={colector.total_ms:.1f};desc="{colector.cantidad} queries"',
+            f"app;dur={total_ms:.1f}",
+        ])
+        if excedido:
+            response["X-SQL-Presupuesto"] = f"{colector.cantidad}/{presupuesto}"
+
+        ms_lenta, sql_lenta = colector.mas_lenta
+        registro = {
+            "metodo": request.method,
+            "ruta": request.path,
+            "vista": vista,
+            "status": response.status_code,
+            "queries": colector.cantidad,
+            "db_ms": round(colector.total_ms, 2),
+            "total_ms": round(total_ms, 2),
+            "mas_lenta_ms": round(ms_lenta, 2),
+            "mas_lenta_sql": sql_lenta[:SQL_LOG_MAX],
+            "duplicadas": colector.duplicadas,
+            "presupuesto": presupuesto,
+        }
+        nivel = logging.WARNING if excedido else logging.INFO
+        logger.log(nivel, json.dumps(registro, ensure_ascii=False))
+        return response
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def crear_indice_fts(apps, schema_editor):
+    from core.busqueda import backend
+
+    b = backend(schema_editor.connection.alias)
+    b.crear_indice()
+    b.reindexar()
+
+
+def borrar_indice_fts(apps, schema_editor):
+    from core.busqueda import backend
+
+    backend(schema_editor.connection.alias).borrar_indice()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_categoria_ejemplar_remove_prestamo_libro_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice_fts, borrar_indice_fts),
+    ]
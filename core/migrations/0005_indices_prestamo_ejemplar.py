@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_titulo_fts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ejemplar',
+            index=models.Index(fields=['estado'], name='ejemplar_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ejemplar',
+            index=models.Index(fields=['titulo', 'estado'], name='ejemplar_titulo_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(fields=['estado', 'vence'], name='prestamo_estado_vence_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(condition=models.Q(('estado__in', ('ACTIVO', 'RENOVADO', 'VENCIDO'))), fields=['vence'], name='prestamo_abiertos_vence_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(fields=['fecha_prestamo', 'id'], name='prestamo_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_indices_prestamo_ejemplar'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(fields=['vence', 'id'], name='prestamo_vence_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:56
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def poblar_contadores(apps, schema_editor):
+    Titulo = apps.get_model("core", "Titulo")
+    Ejemplar = apps.get_model("core", "Ejemplar")
+
+    def conteo(estado):
+        return Coalesce(
+            Subquery(
+                Ejemplar.objects.filter(titulo=OuterRef("pk"), estado=estado)
+                .order_by().values("titulo").annotate(n=Count("id")).values("n")
+            ),
+            Value(0),
+        )
+
+    Titulo.objects.using(schema_editor.connection.alias).update(
+        disponibles=conteo("DISPONIBLE"), prestados=conteo("PRESTADO"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_prestamo_vence_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='titulo',
+            name='disponibles',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='titulo',
+            name='prestados',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(poblar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_titulo_contadores_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrestamoArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('alumno_nombre', models.CharField(max_length=200)),
+                ('alumno_dni', models.CharField(blank=True, max_length=8, null=True)),
+                ('fecha_prestamo', models.DateField()),
+                ('vence', models.DateField()),
+                ('ejemplar', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.ejemplar')),
+                ('titulo', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.titulo')),
+            ],
+            options={
+                'verbose_name': 'préstamo archivado',
+                'verbose_name_plural': 'préstamos archivados',
+                'ordering': ['-fecha_prestamo', '-id'],
+                'indexes': [models.Index(fields=['fecha_prestamo', 'id'], name='archivado_fecha_idx'), models.Index(fields=['alumno_dni'], name='archivado_dni_idx')],
+            },
+        ),
+    ]
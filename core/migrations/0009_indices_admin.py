@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_prestamo_archivado'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ejemplar',
+            index=models.Index(fields=['codigo'], name='ejemplar_codigo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(fields=['alumno_dni'], name='prestamo_dni_idx'),
+        ),
+    ]
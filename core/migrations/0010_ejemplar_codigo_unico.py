@@ -0,0 +1,54 @@
+# Ejemplar.codigo pasa a ser único (y normalizado); los que no tienen
+# reciben el generado EJ + id (ver core/codigos.py).
+from django.db import migrations, models
+from django.db.models import CharField, Count, Min, Value
+from django.db.models.functions import Cast, Concat, LPad, Trim, Upper
+
+
+def normalizar_y_generar(apps, schema_editor):
+    Ejemplar = apps.get_model("core", "Ejemplar")
+    Ejemplar.objects.filter(codigo="").update(codigo=None)
+    Ejemplar.objects.filter(codigo__isnull=False).update(codigo=Upper(Trim("codigo")))
+    Ejemplar.objects.filter(codigo="").update(codigo=None)
+
+    # Códigos repetidos: se queda con el del id más bajo, el resto recibe uno generado.
+    repetidos = (Ejemplar.objects.filter(codigo__isnull=False).values("codigo")
+                 .annotate(n=Count("id"), primero=Min("id")).filter(n__gt=1))
+    for fila in repetidos:
+        (Ejemplar.objects.filter(codigo=fila["codigo"]).exclude(id=fila["primero"])
+         .update(codigo=None))
+
+    generado = Concat(Value("EJ"), LPad(Cast("id", CharField()), 8, Value("0")), output_field=CharField())
+
+    # Códigos cargados a mano con la forma de los generados (EJ + 8 dígitos)
+    # que no son el de su propio id chocarían con el generado de otro
+    # ejemplar (ahora o en una alta futura): se regeneran desde su id.
+    (Ejemplar.objects.filter(codigo__regex=r"^EJ[0-9]{8}$").exclude(codigo=generado)
+     .update(codigo=None))
+
+    Ejemplar.objects.filter(codigo__isnull=True).update(codigo=generado)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_indices_admin'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ejemplar',
+            name='codigo',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.RunPython(normalizar_y_generar, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='ejemplar',
+            name='ejemplar_codigo_idx',
+        ),
+        migrations.AlterField(
+            model_name='ejemplar',
+            name='codigo',
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True),
+        ),
+    ]
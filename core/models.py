@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 from django.db.models.signals import post_migrate
 from django.dispatch import receiver
@@ -31,11 +32,25 @@ class Titulo(models.Model):
 
     categorias = models.ManyToManyField(Categoria, blank=True, related_name="titulos")
 
+    # Contadores de stock (los mantiene core.stock; ver reconciliar_stock)
+    disponibles = models.PositiveIntegerField(default=0, editable=False)
+    prestados   = models.PositiveIntegerField(default=0, editable=False)
+
     class Meta:
         ordering = ["titulo"]
 
     def __str__(self):
             return self.titulo
+
+    def save(self, *args, **kwargs):
+        # Los contadores de stock sólo se tocan con UPDATE ... F() (core.stock):
+        # un save() común no debe pisarlos con los valores viejos en memoria.
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in ("disponibles", "prestados")
+            ]
+        super().save(*args, **kwargs)
         
 def ensure_categoria_otros():
     return Categoria.objects.get_or_create(nombre="Otros")[0]
@@ -55,15 +70,42 @@ class Ejemplar(models.Model):
         ("PRESTADO", "Prestado"),
     ]
     titulo = models.ForeignKey(Titulo, on_delete=models.CASCADE, related_name="ejemplares")
-    codigo = models.CharField(max_length=50, blank=True) 
+    # Único (índice) para resolver un escaneo con una sola búsqueda; ver core/codigos.py.
+    codigo = models.CharField(max_length=50, unique=True, null=True, blank=True)
     estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default="DISPONIBLE")
 
     class Meta:
         ordering = ["titulo_id", "id"]
+        indexes = [
+            models.Index(fields=["estado"], name="ejemplar_estado_idx"),
+            models.Index(fields=["titulo", "estado"], name="ejemplar_titulo_estado_idx"),
+        ]
 
     def __str__(self):
         return f"{self.titulo.titulo} — Ejemplar #{self.id or '—'}"
 
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from .codigos import PREFIJO, codigo_para, normalizar
+
+        codigo = normalizar(self.codigo)
+        if codigo.startswith(PREFIJO) and (self.pk is None or codigo != codigo_para(self.pk)):
+            raise ValidationError({"codigo": f"El prefijo {PREFIJO} está reservado para los códigos generados."})
+
+    def save(self, *args, **kwargs):
+        from .codigos import codigo_para, normalizar
+
+        # Sin código → NULL (el UNIQUE admite varios) y, ya con id, el generado.
+        self.codigo = normalizar(self.codigo) or None
+        super().save(*args, **kwargs)
+        if self.codigo is None:
+            self.codigo = codigo_para(self.pk)
+            type(self).objects.filter(pk=self.pk, codigo__isnull=True).update(codigo=self.codigo)
+
+# Préstamos que todavía no se devolvieron (los que miran dashboard y vencimientos).
+ESTADOS_PRESTAMO_ABIERTOS = ("ACTIVO", "RENOVADO", "VENCIDO")
+
+
 class Prestamo(models.Model):
     ESTADO_PRESTAMO = [
         ("ACTIVO", "Activo"),
@@ -85,6 +127,17 @@ class Prestamo(models.Model):
 
     class Meta:
         ordering = ["-fecha_prestamo"]
+        indexes = [
+            models.Index(fields=["estado", "vence"], name="prestamo_estado_vence_idx"),
+            models.Index(
+                fields=["vence"],
+                condition=Q(estado__in=ESTADOS_PRESTAMO_ABIERTOS),
+                name="prestamo_abiertos_vence_idx",
+            ),
+            models.Index(fields=["fecha_prestamo", "id"], name="prestamo_fecha_idx"),
+            models.Index(fields=["vence", "id"], name="prestamo_vence_idx"),
+            models.Index(fields=["alumno_dni"], name="prestamo_dni_idx"),
+        ]
 
     def __str__(self):
         return f"{self.ejemplar} → {self.alumno_nombre}"
@@ -92,13 +145,43 @@ class Prestamo(models.Model):
    
     def renovar_7(self):
         from datetime import timedelta
+        from .vencimientos import estado_tras_renovar
         self.vence = self.vence + timedelta(days=7)
-        self.estado = "RENOVADO"
+        self.estado = estado_tras_renovar(self.vence)
         self.save()
 
     def marcar_devuelto(self):
+        from .prestamos import liberar_ejemplar
         self.estado = "DEVUELTO"
         self.save()
-        e = self.ejemplar
-        e.estado = "DISPONIBLE"
-        e.save()
+        if self.ejemplar_id:
+            liberar_ejemplar(self.ejemplar_id)
+
+
+class PrestamoArchivado(models.Model):
+    """
+    Préstamo devuelto que salió de la tabla caliente (ver core/archivo.py).
+    Conserva el id original; ejemplar y título quedan como referencias sin
+    FK en la DB para que el archivo no bloquee bajas de ejemplares.
+    """
+    id             = models.BigIntegerField(primary_key=True)
+    ejemplar       = models.ForeignKey(Ejemplar, null=True, on_delete=models.DO_NOTHING,
+                                       db_constraint=False, related_name="+")
+    titulo         = models.ForeignKey(Titulo, null=True, on_delete=models.DO_NOTHING,
+                                       db_constraint=False, related_name="+")
+    alumno_nombre  = models.CharField(max_length=200)
+    alumno_dni     = models.CharField(max_length=8, blank=True, null=True)
+    fecha_prestamo = models.DateField()
+    vence          = models.DateField()
+
+    class Meta:
+        ordering = ["-fecha_prestamo", "-id"]
+        verbose_name = "préstamo archivado"
+        verbose_name_plural = "préstamos archivados"
+        indexes = [
+            models.Index(fields=["fecha_prestamo", "id"], name="archivado_fecha_idx"),
+            models.Index(fields=["alumno_dni"], name="archivado_dni_idx"),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} → {self.alumno_nombre} ({self.fecha_prestamo})"
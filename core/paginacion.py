@@ -0,0 +1,227 @@
+"""
+Paginación por clave (keyset / seek) para listados grandes.
+
+En vez de OFFSET, cada página se pide "a partir de" la última fila vista:
+WHERE (titulo, id) > (:ultimo_titulo, :ultimo_id) ORDER BY titulo, id LIMIT n.
+Así la página 1 y la página 500 cuestan lo mismo (un seek sobre el índice).
+"""
+import base64
+import json
+from dataclasses import dataclass, field
+from math import ceil
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+# -------------------------------------------------------------------
+# Cursores (se viajan en la querystring como ?after= / ?before=)
+# -------------------------------------------------------------------
+def codificar_cursor(valores) -> str:
+    raw = json.dumps(list(valores), default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(token: str):
+    """Devuelve la lista de valores del cursor o None si viene vacío/corrupto."""
+    if not token:
+        return None
+    try:
+        pad = "=" * (-len(token) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(token + pad).decode("utf-8"))
+    except Exception:
+        return None
+    return valores if isinstance(valores, list) else None
+
+
+# -------------------------------------------------------------------
+# Conteo barato / estimado para la barra de páginas
+# -------------------------------------------------------------------
+def contar_filas(qs, umbral_estimado: int = 50_000) -> int:
+    """
+    Cuenta las filas del queryset sin anotaciones ni orden (COUNT(*) simple).
+    Si el queryset no tiene filtros y el motor es PostgreSQL, usa la
+    estimación de pg_class.reltuples cuando la tabla supera `umbral_estimado`.
+    """
+    qs = qs.order_by()
+    if not qs.query.where:
+        estimado = _estimar_filas_tabla(qs.model, qs.db)
+        if estimado is not None and estimado >= umbral_estimado:
+            return estimado
+    return qs.count()
+
+
+async def acontar_filas(qs, umbral_estimado: int = 50_000) -> int:
+    """contar_filas con acount() (la estimación de PostgreSQL va por sync_to_async)."""
+    qs = qs.order_by()
+    if not qs.query.where:
+        estimado = await sync_to_async(_estimar_filas_tabla)(qs.model, qs.db)
+        if estimado is not None and estimado >= umbral_estimado:
+            return estimado
+    return await qs.acount()
+
+
+def _estimar_filas_tabla(model, alias: str):
+    conn = connections[alias]
+    if conn.vendor != "postgresql":
+        return None
+    with conn.cursor() as cur:
+        cur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+        row = cur.fetchone()
+    return int(row[0]) if row and row[0] and row[0] > 0 else None
+
+
+class PaginadorEstimado(Paginator):
+    """
+    Paginator del admin: el total sale de contar_filas (en PostgreSQL, sin
+    filtros y con tablas grandes, la estimación de pg_class en vez de COUNT(*)).
+    Usar junto con show_full_result_count = False.
+    """
+
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, "query"):
+            return contar_filas(self.object_list)
+        return super().count
+
+
+# -------------------------------------------------------------------
+# Paginador
+# -------------------------------------------------------------------
+@dataclass
+class PaginaKeyset:
+    items: list
+    per_page: int
+    numero: int = 1
+    total: int = 0
+    siguiente: str = ""
+    anterior: str = ""
+    extra: dict = field(default_factory=dict)
+
+    @property
+    def paginas(self) -> int:
+        return max(1, ceil(self.total / self.per_page)) if self.total else 1
+
+    @property
+    def hay_siguiente(self) -> bool:
+        return bool(self.siguiente)
+
+    @property
+    def hay_anterior(self) -> bool:
+        return bool(self.anterior)
+
+
+def _filtro_despues(campos, valores):
+    """
+    Arma (c1, c2, ...) > (v1, v2, ...) respetando el sentido de cada campo
+    ("-campo" = descendente). Se expande como OR de prefijos iguales.
+    """
+    filtro = Q()
+    for i, campo in enumerate(campos):
+        desc = campo.startswith("-")
+        nombre = campo.lstrip("-")
+        cond = Q(**{f"{nombre}__{'lt' if desc else 'gt'}": valores[i]})
+        for previo, valor in zip(campos[:i], valores[:i]):
+            cond &= Q(**{previo.lstrip("-"): valor})
+        filtro |= cond
+    return filtro
+
+
+def _valores_cursor(qs, orden, valores):
+    """
+    Los valores del cursor convertidos al tipo de cada campo del orden, o
+    None si no encajan (cursor adulterado o de otro orden): se sirve la
+    página 1 en vez de dejar que el filtro reviente.
+    """
+    if not isinstance(valores, list) or len(valores) != len(orden):
+        return None
+    convertidos = []
+    for campo, valor in zip(orden, valores):
+        nombre = campo.lstrip("-")
+        try:
+            f = qs.model._meta.get_field(nombre)
+        except FieldDoesNotExist:
+            anotacion = qs.query.annotations.get(nombre)
+            if anotacion is None:
+                return None
+            f = anotacion.output_field
+        if valor is None:
+            return None
+        try:
+            valor = f.to_python(valor)
+            f.run_validators(valor)
+        except (TypeError, ValueError, ValidationError):
+            return None
+        convertidos.append(valor)
+    return convertidos
+
+
+def _invertir(campos):
+    return [c[1:] if c.startswith("-") else f"-{c}" for c in campos]
+
+
+def _plan_keyset(qs, orden, after, before, per_page):
+    """(queryset de la página con n+1 filas, hacia_atras, hay_mas_atras)."""
+    orden = list(orden)
+    cur_after = _valores_cursor(qs, orden, decodificar_cursor(after))
+    cur_before = None if cur_after else _valores_cursor(qs, orden, decodificar_cursor(before))
+
+    if cur_before:
+        # Hacia atrás: invertimos el orden, pedimos n+1 y volvemos a dar vuelta.
+        inv = _invertir(orden)
+        return qs.filter(_filtro_despues(inv, cur_before)).order_by(*inv)[: per_page + 1], True, None
+    if cur_after:
+        return qs.filter(_filtro_despues(orden, cur_after)).order_by(*orden)[: per_page + 1], False, True
+    return qs.order_by(*orden)[: per_page + 1], False, False
+
+
+def _armar_pagina(filas, orden, hacia_atras, hay_mas_atras, per_page, numero) -> PaginaKeyset:
+    if hacia_atras:
+        hay_mas_atras = len(filas) > per_page
+        filas = filas[:per_page][::-1]
+        hay_mas_adelante = True
+    else:
+        if not hay_mas_atras:
+            numero = 1
+        hay_mas_adelante = len(filas) > per_page
+        filas = filas[:per_page]
+
+    nombres = [c.lstrip("-") for c in orden]
+
+    def _clave(fila):
+        if isinstance(fila, dict):
+            return [fila[n] for n in nombres]
+        return [getattr(fila, n) for n in nombres]
+
+    pagina = PaginaKeyset(items=filas, per_page=per_page, numero=max(1, numero))
+    if filas and hay_mas_adelante:
+        pagina.siguiente = codificar_cursor(_clave(filas[-1]))
+    if filas and hay_mas_atras:
+        pagina.anterior = codificar_cursor(_clave(filas[0]))
+    return pagina
+
+
+def paginar_keyset(qs, orden=("titulo", "id"), after: str = "", before: str = "",
+                   per_page: int = 10, numero: int = 1) -> PaginaKeyset:
+    """
+    Trae sólo la página pedida de `qs` ordenada por `orden` (el último campo
+    debe ser único, normalmente "id").
+
+    - after:  cursor de la última fila de la página previa → página siguiente.
+    - before: cursor de la primera fila de la página actual → página anterior.
+    - numero: número de página sólo para mostrar ("Página n de N").
+    """
+    pedido, hacia_atras, hay_mas_atras = _plan_keyset(qs, orden, after, before, per_page)
+    return _armar_pagina(list(pedido), orden, hacia_atras, hay_mas_atras, per_page, numero)
+
+
+async def apaginar_keyset(qs, orden=("titulo", "id"), after: str = "", before: str = "",
+                          per_page: int = 10, numero: int = 1) -> PaginaKeyset:
+    """paginar_keyset para vistas async (la página se lee con el ORM async)."""
+    pedido, hacia_atras, hay_mas_atras = _plan_keyset(qs, orden, after, before, per_page)
+    filas = [fila async for fila in pedido]
+    return _armar_pagina(filas, orden, hacia_atras, hay_mas_atras, per_page, numero)
@@ -0,0 +1,173 @@
+"""
+Motor de préstamos: reserva atómica de ejemplares.
+
+Un ejemplar se "reclama" con un UPDATE condicional
+(UPDATE ... SET estado='PRESTADO' WHERE id=? AND estado='DISPONIBLE'):
+si otra caja se lo llevó primero, el UPDATE afecta 0 filas y se prueba
+con el siguiente. En motores con SELECT ... FOR UPDATE SKIP LOCKED
+(PostgreSQL) se usa eso para que cada transacción tome una fila distinta
+sin esperar a las demás, y en SQLite un único UPDATE ... RETURNING.
+
+En el mostrador, `prestar_por_codigo` / `devolver_por_codigo` resuelven el
+ejemplar escaneado por Ejemplar.codigo (único, ver core/codigos.py).
+"""
+from datetime import date
+
+from django.db import connections, router, transaction
+
+from . import codigos, metricas, stock
+from .models import ESTADOS_PRESTAMO_ABIERTOS, Ejemplar, Prestamo
+
+
+class SinEjemplaresDisponibles(Exception):
+    """El título no tiene (más) ejemplares DISPONIBLE."""
+
+
+class EjemplarNoDisponible(Exception):
+    """El ejemplar pedido ya no está DISPONIBLE."""
+
+
+class CodigoDesconocido(Exception):
+    """Ningún ejemplar tiene ese código."""
+
+
+class SinPrestamoAbierto(Exception):
+    """El ejemplar no tiene un préstamo abierto que devolver."""
+
+
+def reclamar_ejemplar(ejemplar_id) -> bool:
+    """Pasa el ejemplar a PRESTADO sólo si seguía DISPONIBLE. True si lo tomamos nosotros."""
+    if Ejemplar.objects.filter(pk=ejemplar_id, estado="DISPONIBLE").update(estado="PRESTADO") != 1:
+        return False
+    stock.ajustar_por_ejemplar(ejemplar_id, disponibles=-1, prestados=1)
+    return True
+
+
+def liberar_ejemplar(ejemplar_id) -> bool:
+    """Vuelve el ejemplar a DISPONIBLE si estaba prestado. True si cambió."""
+    if Ejemplar.objects.filter(pk=ejemplar_id).exclude(estado="DISPONIBLE").update(estado="DISPONIBLE") != 1:
+        return False
+    stock.ajustar_por_ejemplar(ejemplar_id, disponibles=1, prestados=-1)
+    return True
+
+
+def reclamar_de_titulo(candidatos: int = 5, **filtro_titulo):
+    """
+    Reclama un ejemplar DISPONIBLE cualquiera del título indicado
+    (p.ej. titulo_id=3 o titulo__titulo="Cosmos"), o uno puntual con
+    codigo="EJ00000042". Devuelve el id o None.
+    Debe llamarse dentro de una transacción.
+    """
+    libres = Ejemplar.objects.filter(estado="DISPONIBLE", **filtro_titulo).order_by("id")
+    conn = connections[router.db_for_write(Ejemplar)]
+
+    if conn.features.has_select_for_update_skip_locked:
+        # of=self: filtrando por nombre hay JOIN a core_titulo y sin esto también se
+        # bloquearía la fila del título (la segunda caja saltearía todos los ejemplares).
+        fila = libres.select_for_update(skip_locked=True, of=("self",)).values_list("id", "titulo_id").first()
+        if fila is None:
+            return None
+        Ejemplar.objects.filter(pk=fila[0]).update(estado="PRESTADO")
+        stock.ajustar(fila[1], disponibles=-1, prestados=1)
+        return fila[0]
+
+    if conn.vendor == "sqlite" and conn.Database.sqlite_version_info >= (3, 35):
+        # Un solo UPDATE ... RETURNING: toma el lock de escritura de entrada,
+        # sin un SELECT previo que tenga que "subir" de lectura a escritura.
+        sub_sql, sub_params = libres.values("id")[:1].query.sql_with_params()
+        tabla = Ejemplar._meta.db_table
+        with conn.cursor() as cur:
+            cur.execute(
+                f"UPDATE {tabla} SET estado = %s WHERE id = ({sub_sql}) AND estado = %s RETURNING id, titulo_id",
+                ["PRESTADO", *sub_params, "DISPONIBLE"],
+            )
+            fila = cur.fetchone()
+        if fila is None:
+            return None
+        stock.ajustar(fila[1], disponibles=-1, prestados=1)
+        return fila[0]
+
+    while True:
+        ids = list(libres.values_list("id", flat=True)[:candidatos])
+        if not ids:
+            return None
+        for ej_id in ids:
+            if reclamar_ejemplar(ej_id):
+                return ej_id
+        # Todos los candidatos se los llevaron otras cajas: volvemos a mirar.
+
+
+def prestar(*, alumno: str, dni: str, vence: date, titulo_id=None, titulo: str | None = None,
+            fecha: date | None = None) -> Prestamo:
+    """
+    Presta un ejemplar disponible del título (por id o por nombre exacto).
+    Reserva + alta del préstamo van en la misma transacción.
+    Lanza SinEjemplaresDisponibles si no queda stock.
+    """
+    filtro = {"titulo_id": titulo_id} if titulo_id is not None else {"titulo__titulo": titulo}
+    with transaction.atomic():
+        ej_id = reclamar_de_titulo(**filtro)
+        if ej_id is None:
+            raise SinEjemplaresDisponibles(titulo or titulo_id)
+        return Prestamo.objects.create(
+            ejemplar_id=ej_id,
+            alumno_nombre=alumno,
+            alumno_dni=dni,
+            fecha_prestamo=fecha or date.today(),
+            vence=vence,
+            estado="ACTIVO",
+        )
+
+
+def prestar_por_codigo(*, codigo: str, alumno: str, dni: str, vence: date,
+                       fecha: date | None = None) -> Prestamo:
+    """
+    Presta el ejemplar escaneado: reclamo condicional por código (índice
+    único) + alta del préstamo en la misma transacción.
+    Lanza CodigoDesconocido o EjemplarNoDisponible (ya prestado, en
+    reparación, o se lo llevó otra caja).
+    """
+    codigo = codigos.normalizar(codigo)
+    with transaction.atomic():
+        ej_id = reclamar_de_titulo(codigo=codigo) if codigo else None
+        if ej_id is None:
+            # Sólo en el camino de error: distinguir "no existe" de "no está libre".
+            if not codigo or not Ejemplar.objects.filter(codigo=codigo).exists():
+                raise CodigoDesconocido(codigo)
+            raise EjemplarNoDisponible(codigo)
+        return Prestamo.objects.create(
+            ejemplar_id=ej_id,
+            alumno_nombre=alumno,
+            alumno_dni=dni,
+            fecha_prestamo=fecha or date.today(),
+            vence=vence,
+            estado="ACTIVO",
+        )
+
+
+def devolver_por_codigo(codigo: str) -> Prestamo:
+    """
+    Devuelve el préstamo abierto del ejemplar escaneado y lo libera.
+    El préstamo se cierra con un UPDATE condicional (sólo si sigue abierto):
+    dos escaneos simultáneos del mismo ejemplar no lo liberan dos veces.
+    Lanza CodigoDesconocido o SinPrestamoAbierto.
+    """
+    codigo = codigos.normalizar(codigo)
+    with transaction.atomic():
+        prestamo = (
+            Prestamo.objects.filter(ejemplar__codigo=codigo, estado__in=ESTADOS_PRESTAMO_ABIERTOS)
+            .select_related("ejemplar__titulo").order_by("-id").first()
+        ) if codigo else None
+        if prestamo is None:
+            if not codigo or not Ejemplar.objects.filter(codigo=codigo).exists():
+                raise CodigoDesconocido(codigo)
+            raise SinPrestamoAbierto(codigo)
+        cerrados = (Prestamo.objects.filter(pk=prestamo.pk, estado__in=ESTADOS_PRESTAMO_ABIERTOS)
+                    .update(estado="DEVUELTO"))
+        if cerrados != 1:
+            raise SinPrestamoAbierto(codigo)
+        prestamo.estado = "DEVUELTO"
+        liberar_ejemplar(prestamo.ejemplar_id)
+        # update() no manda post_save: el dashboard se invalida a mano.
+        metricas.invalidar()
+        return prestamo
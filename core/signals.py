@@ -0,0 +1,63 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+
+from . import busqueda, cache_catalogo, metricas, middleware
+from .models import Titulo, Ejemplar, Prestamo, Categoria
+
+
+# -------------------------------------------------------------------
+# Índice de búsqueda (FTS) sincronizado con Titulo
+# -------------------------------------------------------------------
+@receiver(post_save, sender=Titulo)
+def indexar_titulo(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    busqueda.backend(instance._state.db).reindexar([instance.pk])
+
+
+@receiver(post_delete, sender=Titulo)
+def desindexar_titulo(sender, instance, **kwargs):
+    busqueda.backend(instance._state.db).eliminar([instance.pk])
+
+
+# -------------------------------------------------------------------
+# Caché del dashboard: cualquier alta/baja/cambio de stock o préstamos
+# -------------------------------------------------------------------
+@receiver(post_save, sender=Ejemplar)
+@receiver(post_delete, sender=Ejemplar)
+@receiver(post_save, sender=Prestamo)
+@receiver(post_delete, sender=Prestamo)
+def invalidar_metricas(sender, **kwargs):
+    metricas.invalidar()
+
+
+# -------------------------------------------------------------------
+# Caché del catálogo (lista de categorías + fragmento de la tabla)
+# -------------------------------------------------------------------
+@receiver(post_save, sender=Titulo)
+@receiver(post_delete, sender=Titulo)
+@receiver(post_save, sender=Ejemplar)
+@receiver(post_delete, sender=Ejemplar)
+def invalidar_catalogo(sender, raw=False, **kwargs):
+    if not raw:
+        cache_catalogo.invalidar()
+
+
+@receiver(m2m_changed, sender=Titulo.categorias.through)
+def invalidar_catalogo_por_categorias(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        cache_catalogo.invalidar()
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_categorias(sender, raw=False, **kwargs):
+    if not raw:
+        cache_catalogo.invalidar_categorias()
+
+
+# -------------------------------------------------------------------
+# Instrumentación SQL (core/middleware.py) en cada conexión nueva
+# -------------------------------------------------------------------
+connection_created.connect(middleware.instalar, dispatch_uid="core.sql.instalar")
@@ -0,0 +1,80 @@
+"""
+Contadores de stock desnormalizados en Titulo (disponibles / prestados).
+
+Cada escritura que cambia el estado de un ejemplar ajusta los contadores
+con F() en la misma transacción; las cargas masivas los recalculan por
+lote con un UPDATE ... SET = (subconsulta). `reconciliar_stock` detecta y
+repara desvíos. Como son UPDATE sin señales, acá mismo se sube la versión
+de la caché del catálogo.
+"""
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from . import cache_catalogo
+from .models import Titulo, Ejemplar
+
+CAMPO_POR_ESTADO = {"DISPONIBLE": "disponibles", "PRESTADO": "prestados"}
+
+
+def _deltas(**cambios):
+    # Las restas se topean en 0: un contador desviado no debe hacer fallar un
+    # préstamo por el CHECK >= 0; el desvío lo corrige reconciliar_stock.
+    return {
+        campo: F(campo) + delta if delta > 0 else Greatest(F(campo) + delta, Value(0))
+        for campo, delta in cambios.items() if delta
+    }
+
+
+def ajustar(titulo_id, disponibles: int = 0, prestados: int = 0) -> None:
+    cambios = _deltas(disponibles=disponibles, prestados=prestados)
+    if cambios:
+        Titulo.objects.filter(pk=titulo_id).update(**cambios)
+        cache_catalogo.invalidar()
+
+
+def ajustar_por_ejemplar(ejemplar_id, disponibles: int = 0, prestados: int = 0) -> None:
+    """Igual que ajustar() pero sin conocer el título (UPDATE ... WHERE id IN (subquery))."""
+    cambios = _deltas(disponibles=disponibles, prestados=prestados)
+    if cambios:
+        Titulo.objects.filter(pk__in=Ejemplar.objects.filter(pk=ejemplar_id).values("titulo_id")).update(**cambios)
+        cache_catalogo.invalidar()
+
+
+def alta(titulo_id, estado: str, cantidad: int = 1) -> None:
+    ajustar(titulo_id, **{CAMPO_POR_ESTADO[estado]: cantidad})
+
+
+def baja(titulo_id, estado: str, cantidad: int = 1) -> None:
+    ajustar(titulo_id, **{CAMPO_POR_ESTADO[estado]: -cantidad})
+
+
+def cambio_estado(titulo_id, antes: str, despues: str) -> None:
+    if antes != despues:
+        ajustar(titulo_id, **{CAMPO_POR_ESTADO[antes]: -1, CAMPO_POR_ESTADO[despues]: 1})
+
+
+def _conteo_real(estado):
+    return Coalesce(
+        Subquery(
+            Ejemplar.objects.filter(titulo=OuterRef("pk"), estado=estado)
+            .order_by().values("titulo").annotate(n=Count("id")).values("n")
+        ),
+        Value(0),
+    )
+
+
+def recalcular(titulo_ids=None) -> int:
+    """Recalcula los contadores desde Ejemplar (todos o sólo los ids dados)."""
+    qs = Titulo.objects.all() if titulo_ids is None else Titulo.objects.filter(pk__in=list(titulo_ids))
+    n = qs.update(disponibles=_conteo_real("DISPONIBLE"), prestados=_conteo_real("PRESTADO"))
+    cache_catalogo.invalidar()
+    return n
+
+
+def desvios():
+    """Títulos cuyos contadores no coinciden con los ejemplares reales."""
+    return (
+        Titulo.objects
+        .annotate(real_disponibles=_conteo_real("DISPONIBLE"), real_prestados=_conteo_real("PRESTADO"))
+        .exclude(disponibles=F("real_disponibles"), prestados=F("real_prestados"))
+    )
@@ -0,0 +1,52 @@
+"""
+Barrido de vencimientos: pasa a VENCIDO los préstamos abiertos cuyo
+vencimiento ya pasó.
+
+Lo corre a diario el comando `marcar_vencidos` (cron / tarea programada);
+las vistas sólo leen. Es idempotente: cada lote vuelve a filtrar por
+estado y fecha, así que correrlo dos veces no cambia nada de más.
+Con el estado al día, "atrasados" es un `estado = 'VENCIDO'` sobre el
+índice (estado, vence) en vez de un rango por fecha en cada request.
+"""
+from datetime import date
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Prestamo
+
+ESTADOS_A_VENCER = ("ACTIVO", "RENOVADO")
+LOTE = 5000
+CACHE_ULTIMO = "prestamos:vencidos:ultimo"
+
+
+def _pendientes(hoy: date):
+    return Prestamo.objects.filter(estado__in=ESTADOS_A_VENCER, vence__lt=hoy)
+
+
+def marcar_vencidos(hoy: date | None = None, lote: int = LOTE) -> int:
+    """
+    Marca VENCIDO en lotes de `lote` filas (un UPDATE por lote, cada uno en
+    su transacción, para no tener la tabla tomada con millones de filas).
+    Devuelve cuántos préstamos cambiaron.
+    """
+    hoy = hoy or date.today()
+    marcados = 0
+    while True:
+        with transaction.atomic():
+            ids = list(_pendientes(hoy).order_by("id").values_list("id", flat=True)[:lote])
+            if not ids:
+                break
+            marcados += _pendientes(hoy).filter(pk__in=ids).update(estado="VENCIDO")
+    cache.set(CACHE_ULTIMO, {"fecha": hoy, "marcados": marcados}, None)
+    return marcados
+
+
+def ultimo_barrido() -> dict | None:
+    """{"fecha": date, "marcados": int} de la última corrida, si hubo."""
+    return cache.get(CACHE_ULTIMO)
+
+
+def estado_tras_renovar(vence: date, hoy: date | None = None) -> str:
+    """Si aun renovado el vencimiento sigue en el pasado, el préstamo queda VENCIDO."""
+    return "VENCIDO" if vence < (hoy or date.today()) else "RENOVADO"
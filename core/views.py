@@ -1,18 +1,22 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse
 from django.views.decorators.http import require_http_methods
-from math import ceil
-from django.db import IntegrityError, transaction
+from django.db import IntegrityError, connection, transaction
 from datetime import date, timedelta, datetime
-from io import BytesIO, StringIO
-import csv
-from django.db.models import Q, Count
+from django.db.models import Prefetch
 from django.contrib import messages
 from django.views.decorators.http import require_POST
 from django.http import JsonResponse
-from django.utils.encoding import smart_str
-from .models import Titulo, Ejemplar, Prestamo, Categoria, ensure_categoria_otros
+from django.conf import settings
+from django.core.cache import cache
+import hashlib
+import re
+from dataclasses import asdict
+from urllib.parse import urlencode
+from .models import Titulo, Prestamo, Categoria, ensure_categoria_otros
 from .forms import LibroForm, PrestamoForm
+from .paginacion import paginar_keyset, contar_filas
+from . import busqueda, cache_catalogo, codigos, exportacion, lotes, metricas, prestamos, vencimientos
+from .categorizador import categorizador, FALLBACK_CATEGORY
 
 
 # -------------------------------------------------------------------
@@ -57,71 +61,90 @@ PRESTAMOS = [
 # -------------------------------------------------------------------
 # Dashboard
 # -------------------------------------------------------------------
-def dashboard(request):
-    hoy = date.today()
+def _contexto_dashboard(datos) -> dict:
+    return {
+        "total": datos["total"],
+        "prestados": datos["prestados"],
+        "disponibles": datos["disponibles"],
+        "ocupacion": datos["ocupacion"],
+        "vence_7d": datos["vence_7d"],
+        "atrasados": datos["atrasados"],
+    }
 
-    stock_total = Ejemplar.objects.count()
-    prestados = Ejemplar.objects.filter(estado__iexact="Prestado").count()
-    disponibles = Ejemplar.objects.filter(estado__iexact="Disponible").count()
-    ocupacion = round((prestados / stock_total) * 100, 1) if stock_total else 0
-
-    vence_7d_qs = (
-        Prestamo.objects
-        .select_related("ejemplar__titulo")
-        .filter(estado__in=["ACTIVO","RENOVADO"], vence__gt=hoy, vence__lte=hoy + timedelta(days=7))
-        .values("alumno_nombre", "ejemplar__titulo__titulo", "vence")
-        .order_by("vence")
-    )
-    atrasados_qs = (
-        Prestamo.objects
-        .select_related("ejemplar__titulo")
-        .filter(estado__in=["ACTIVO","RENOVADO"], vence__lt=hoy)
-        .values("alumno_nombre", "ejemplar__titulo__titulo", "vence")
-        .order_by("vence")
-    )
 
-    vence_7d = [{"alumno": d["alumno_nombre"], "libro": d["ejemplar__titulo__titulo"], "vence": d["vence"]} for d in vence_7d_qs]
-    atrasados = [{"alumno": d["alumno_nombre"], "libro": d["ejemplar__titulo__titulo"], "vence": d["vence"]} for d in atrasados_qs]
-
-    return render(request, "dashboard.html", {
-        "total": stock_total,
-        "prestados": prestados,
-        "disponibles": disponibles,
-        "ocupacion": ocupacion,
-        "vence_7d": vence_7d,
-        "atrasados": atrasados,
-    })
+def dashboard(request):
+    return render(request, "dashboard.html", _contexto_dashboard(metricas.metricas_dashboard()))
 
 
 # -------------------------------------------------------------------
 # Listado de libros (con conteo de stock DISPONIBLE/PRESTADO)
 # -------------------------------------------------------------------
-def libros_list(req):
-    q = (req.GET.get("q") or "").strip()
-    cat = (req.GET.get("cat") or "").strip()
-    page = int(req.GET.get("page", 1))
-    per_page = int(req.GET.get("per_page", 8))
-    per_page_choice = [5, 10, 20]
+ORDEN_LIBROS = ("titulo", "id")
 
-    qs = (
-        Titulo.objects
-        .annotate(
-            disponibles=Count("ejemplares", filter=Q(ejemplares__estado="DISPONIBLE")),
-            prestados=Count("ejemplares",   filter=Q(ejemplares__estado="PRESTADO")),
-        )
-        .prefetch_related("categorias")
-        .order_by("titulo")
-    )
 
-    if q:
-        qs = qs.filter(Q(titulo__icontains=q) | Q(autor__icontains=q))
-    if cat:
-        qs = qs.filter(categorias__nombre__iexact=cat)
+def _prefetch_categorias():
+    """Una sola query para las categorías de todos los títulos del lote."""
+    return Prefetch("categorias", queryset=Categoria.objects.only("id", "nombre").order_by("nombre"))
+
 
-    data = []
-    for t in qs:
-        cats = ", ".join(t.categorias.values_list("nombre", flat=True))
-        data.append({
+def _nombres_categorias(titulo) -> str:
+    # Usa el caché del prefetch (no dispara SQL por fila).
+    return ", ".join(c.nombre for c in titulo.categorias.all())
+
+
+def _params_libros(req) -> dict:
+    try:
+        page = int(req.GET.get("page", 1))
+    except ValueError:
+        page = 1
+    try:
+        per_page = int(req.GET.get("per_page", 8))
+    except ValueError:
+        per_page = 8
+    return {
+        "q": (req.GET.get("q") or "").strip(),
+        "cat": (req.GET.get("cat") or "").strip(),
+        "after": (req.GET.get("after") or "").strip(),
+        "before": (req.GET.get("before") or "").strip(),
+        "page": page,
+        "per_page": max(1, min(per_page, 100)),
+    }
+
+
+def _contexto_libros(p) -> tuple[dict, bool]:
+    """
+    Contexto fijo del listado + si el fragmento de la tabla ya está en caché
+    (en ese caso va en ctx["tabla_html"] y el template lo usa tal cual).
+    """
+    vary = cache_catalogo.vary_tabla(**p)
+    tabla_html = cache_catalogo.tabla_html(vary)
+    ctx = {
+        "cats": [c["nombre"] for c in cache_catalogo.categorias()],
+        "q": p["q"], "cat": p["cat"],
+        "per_page": p["per_page"], "per_page_choice": [5, 10, 20],
+        "cache_vary": vary, "cache_segundos": cache_catalogo.segundos(),
+        "tabla_html": tabla_html,
+    }
+    return ctx, tabla_html is not None
+
+
+def _consulta_libros(p):
+    base = Titulo.objects.all()
+    if p["q"]:
+        base = busqueda.filtrar(base, p["q"])
+    if p["cat"]:
+        base = base.filter(categorias__nombre__iexact=p["cat"])
+    # Sólo se traen las filas de la página pedida; disponibles/prestados son
+    # contadores guardados en Titulo (sin JOIN ni GROUP BY contra Ejemplar).
+    return base, base.prefetch_related(_prefetch_categorias())
+
+
+def _contexto_pagina_libros(p, pagina, total) -> dict:
+    pagina.total = total
+    page_items = []
+    for t in pagina.items:
+        cats = _nombres_categorias(t)
+        page_items.append({
             "id":t.id,
             "titulo": t.titulo,
             "autor": t.autor,
@@ -130,60 +153,52 @@ def libros_list(req):
             "prestados": t.prestados,
         })
 
-    total = len(data)
-    pages = max(1, ceil(total / per_page)) if total else 1
-    page = max(1, min(page, pages))
-    start, end = (page - 1) * per_page, (page - 1) * per_page + per_page
-    page_items = data[start:end]
+    pages = pagina.paginas
+    return {
+        "libros": page_items,
+        "page": min(pagina.numero, pages), "pages": pages, "total": total,
+        "querystring_base": urlencode({"q": p["q"], "cat": p["cat"], "per_page": p["per_page"]}),
+        "next_cursor": pagina.siguiente,
+        "prev_cursor": pagina.anterior,
+    }
 
-    cats = list(Categoria.objects.order_by("nombre").values_list("nombre", flat=True))
 
-    return render(req, "libros_list.html", {
-        "libros": page_items,
-        "cats": cats,
-        "q": q, "cat": cat,
-        "page": page, "pages": pages, "total": total,
-        "per_page": per_page, "per_page_choice": per_page_choice,
-        "querystring_base": f"q={q}&cat={cat}&per_page={per_page}",
-        "page_range": range(1, pages + 1),
-    })
+def libros_list(req):
+    p = _params_libros(req)
+    ctx, cacheada = _contexto_libros(p)
+    # Si el fragmento de la tabla está en caché (misma búsqueda, página y
+    # versión de datos) no hace falta ir a la DB: el template usa ese HTML.
+    if cacheada:
+        return render(req, "libros_list.html", ctx)
+
+    base, qs = _consulta_libros(p)
+    pagina = paginar_keyset(qs, orden=ORDEN_LIBROS, after=p["after"], before=p["before"],
+                            per_page=p["per_page"], numero=p["page"])
+    ctx.update(_contexto_pagina_libros(p, pagina, contar_filas(base)))
+    return render(req, "libros_list.html", ctx)
 
 def libros_export(request):
     """
-    Exporta a Excel (.xlsx) el catálogo: Título, Autor, Categorías, Disponibles, Prestados, Stock total.
+    Exporta el catálogo: Título, Autor, Categorías, Disponibles, Prestados, Stock total.
     Respeta filtros por ?q=&cat= si vienen en la querystring.
-    Si no está disponible openpyxl, cae a CSV automáticamente.
+    ?formato=csv|xlsx (default xlsx). Ambos se generan en streaming, con
+    memoria constante; si no está disponible openpyxl, cae a CSV.
     """
     q = (request.GET.get("q") or "").strip()
     cat = (request.GET.get("cat") or "").strip()
+    formato = (request.GET.get("formato") or "xlsx").strip().lower()
 
     qs = (
         Titulo.objects
-        .annotate(
-            disponibles=Count("ejemplares", filter=Q(ejemplares__estado="DISPONIBLE")),
-            prestados=Count("ejemplares",   filter=Q(ejemplares__estado="PRESTADO")),
-        )
-        .prefetch_related("categorias")
+        .prefetch_related(_prefetch_categorias())
         .order_by("titulo")
     )
     if q:
-        qs = qs.filter(Q(titulo__icontains=q) | Q(autor__icontains=q))
+        qs = busqueda.filtrar(qs, q)
     if cat:
         qs = qs.filter(categorias__nombre__iexact=cat)
 
-    rows = []
-    for t in qs:
-        cats = ", ".join(t.categorias.values_list("nombre", flat=True))
-        disp = t.disponibles or 0
-        pres = t.prestados or 0
-        rows.append([
-            smart_str(t.titulo),
-            smart_str(t.autor),
-            smart_str(cats or "—"),
-            disp,
-            pres,
-            disp + pres,  # Stock total
-        ])
+    filas = exportacion.filas_catalogo(qs, _nombres_categorias)
 
     filename_base = "catalogo_libros"
     if q or cat:
@@ -192,47 +207,13 @@ def libros_export(request):
     filename_xlsx = f"{filename_base}_{stamp}.xlsx"
     filename_csv  = f"{filename_base}_{stamp}.csv"
 
-    # Intento XLSX
-    try:
-        from openpyxl import Workbook
-        from openpyxl.utils import get_column_letter
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Libros"
-
-        headers = ["Título", "Autor", "Categorías", "Disponibles", "Prestados", "Stock total"]
-        ws.append(headers)
-        for r in rows:
-            ws.append(r)
-
-        # Auto-anchos sencillos
-        for col_idx, header in enumerate(headers, start=1):
-            max_len = len(str(header))
-            for r in rows:
-                max_len = max(max_len, len(str(r[col_idx-1])) if r[col_idx-1] is not None else 0)
-            ws.column_dimensions[get_column_letter(col_idx)].width = min(max_len + 2, 60)
-
-        stream = BytesIO()
-        wb.save(stream)
-        stream.seek(0)
-
-        resp = HttpResponse(
-            stream.getvalue(),
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        resp["Content-Disposition"] = f'attachment; filename="{filename_xlsx}"'
-        return resp
-
-    except Exception:
-        # Fallback CSV si no hay openpyxl
-        sio = StringIO()
-        writer = csv.writer(sio)
-        writer.writerow(["Título", "Autor", "Categorías", "Disponibles", "Prestados", "Stock total"])
-        writer.writerows(rows)
-        resp = HttpResponse(sio.getvalue(), content_type="text/csv; charset=utf-8")
-        resp["Content-Disposition"] = f'attachment; filename="{filename_csv}"'
-        return resp
+    if formato != "csv":
+        try:
+            return exportacion.respuesta_xlsx(filas, filename_xlsx)
+        except ImportError:
+            # Fallback CSV si no hay openpyxl
+            pass
+    return exportacion.respuesta_csv(filas, filename_csv)
 
 
 # ---------- LIBROS ----------
@@ -240,7 +221,8 @@ def libros_export(request):
 def libro_create(request):
     """
     Crea un Titulo + un Ejemplar inicial DISPONIBLE (lo hace el LibroForm.save()).
-    Acepta múltiples categorías; si no se elige ninguna, asigna 'Otros'.
+    Acepta múltiples categorías; si no se elige ninguna, la deduce por palabras
+    clave del título (core.categorizador) y si no hay match asigna 'Otros'.
     """
     if request.method == "POST":
         form = LibroForm(request.POST)
@@ -250,10 +232,15 @@ def libro_create(request):
                     # IMPORTANTE: commit=True (por defecto). Esto evita el error.
                     titulo_obj = form.save()  # crea también el Ejemplar si no existe
 
-                    # Si no se eligió ninguna categoría en el form, agregamos 'Otros'
+                    # Si no se eligió ninguna categoría en el form, la deducimos
+                    # por palabras clave del título (o 'Otros' si no matchea nada)
                     if titulo_obj.categorias.count() == 0:
-                        otros = ensure_categoria_otros()
-                        titulo_obj.categorias.add(otros)
+                        nombre = categorizador().categoria_o_fallback(titulo_obj.titulo)
+                        if nombre == FALLBACK_CATEGORY:
+                            cat_obj = ensure_categoria_otros()
+                        else:
+                            cat_obj = Categoria.objects.get_or_create(nombre=nombre)[0]
+                        titulo_obj.categorias.add(cat_obj)
 
                 messages.success(request, f"Título «{titulo_obj.titulo}» cargado (stock inicial: 1).")
                 return redirect("libros_list")
@@ -262,13 +249,13 @@ def libro_create(request):
                 messages.error(request, "Ya existe un título con ese nombre.")
                 return render(request, "libro_form.html", {
                     "form": form,
-                    "categorias_all": Categoria.objects.order_by("nombre"),
+                    "categorias_all": cache_catalogo.categorias(),
                 })
 
         # form inválido → re-render con errores
         return render(request, "libro_form.html", {
             "form": form,
-            "categorias_all": Categoria.objects.order_by("nombre"),
+            "categorias_all": cache_catalogo.categorias(),
         })
     
 
@@ -278,7 +265,7 @@ def libro_create(request):
     form = LibroForm()
     return render(request, "libro_form.html", {
         "form": form,
-        "categorias_all": Categoria.objects.order_by("nombre"),
+        "categorias_all": cache_catalogo.categorias(),
     })
 
   #LIBRO DELETE 
@@ -304,6 +291,30 @@ def categoria_create_ajax(request):
     return JsonResponse({"ok": True, "id": cat.id, "nombre": cat.nombre, "created": created, "message": msg})
 
 
+def _reasignar_a_otros(cat, otros):
+    """
+    Saca `cat` de todos sus títulos y le pone `otros` a los que quedarían sin
+    categoría. Dos sentencias sobre la tabla intermedia, sin importar cuántos
+    títulos tenga la categoría:
+      1) INSERT ... SELECT de los vínculos a 'Otros' de los títulos cuya única
+         categoría es `cat`;
+      2) DELETE de los vínculos a `cat`.
+    """
+    through = Titulo.categorias.through
+    tabla = connection.ops.quote_name(through._meta.db_table)
+    col_t = connection.ops.quote_name(through._meta.get_field("titulo").column)
+    col_c = connection.ops.quote_name(through._meta.get_field("categoria").column)
+    with connection.cursor() as cur:
+        cur.execute(
+            f"INSERT INTO {tabla} ({col_t}, {col_c}) "
+            f"SELECT v.{col_t}, %s FROM {tabla} v "
+            f"WHERE v.{col_c} = %s AND NOT EXISTS ("
+            f"  SELECT 1 FROM {tabla} o WHERE o.{col_t} = v.{col_t} AND o.{col_c} <> %s)",
+            [otros.pk, cat.pk, cat.pk],
+        )
+    through.objects.filter(categoria=cat).delete()
+
+
 @require_POST
 @transaction.atomic
 def categoria_delete(request, pk):
@@ -316,13 +327,7 @@ def categoria_delete(request, pk):
         return redirect(request.META.get("HTTP_REFERER", "libros_list"))
 
     otros = ensure_categoria_otros()
-
-    titulos = Titulo.objects.filter(categorias=cat).distinct()
-    for t in titulos:
-        t.categorias.remove(cat)
-        if t.categorias.count() == 0:
-            t.categorias.add(otros)
-
+    _reasignar_a_otros(cat, otros)
     cat.delete()
     messages.success(request, "Categoría eliminada. Los títulos quedaron reasignados a 'Otros' cuando correspondía.")
     return redirect(request.META.get("HTTP_REFERER", "libros_list"))
@@ -331,31 +336,112 @@ def categoria_delete(request, pk):
 # -------------------------------------------------------------------
 # Préstamos: listado / crear / renovar / devolver / eliminar
 # -------------------------------------------------------------------
-def prestamos_list(request):
-    data = list(
-        Prestamo.objects
-        .select_related("ejemplar__titulo")
-        .values("id", "alumno_nombre", "alumno_dni", "ejemplar__titulo__titulo", "fecha_prestamo", "vence", "estado")
-        .order_by("-fecha_prestamo")
-    )
+# Orden permitido en el listado → campos del keyset (todos con índice).
+ORDENES_PRESTAMOS = {
+    "-fecha": ("-fecha_prestamo", "-id"),
+    "fecha": ("fecha_prestamo", "id"),
+    "-vence": ("-vence", "-id"),
+    "vence": ("vence", "id"),
+}
+
+
+def _parse_fecha(valor):
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _consulta_prestamos(request) -> tuple:
+    """
+    (queryset filtrado, queryset de filas, parámetros) a partir de
+    ?estado= &desde= &hasta= (fecha de préstamo) &dni= &libro= &orden= &per_page=
+    """
+    estado = (request.GET.get("estado") or "").strip().upper()
+    desde = _parse_fecha(request.GET.get("desde"))
+    hasta = _parse_fecha(request.GET.get("hasta"))
+    dni = (request.GET.get("dni") or "").strip()
+    libro = (request.GET.get("libro") or "").strip()
+    orden = request.GET.get("orden") or "-fecha"
+    if orden not in ORDENES_PRESTAMOS:
+        orden = "-fecha"
+    try:
+        page = int(request.GET.get("page", 1))
+    except ValueError:
+        page = 1
+    try:
+        per_page = max(1, min(int(request.GET.get("per_page", 25)), 200))
+    except ValueError:
+        per_page = 25
+
+    base = Prestamo.objects.all()
+    if estado in dict(Prestamo.ESTADO_PRESTAMO):
+        base = base.filter(estado=estado)
+    else:
+        estado = ""
+    if desde:
+        base = base.filter(fecha_prestamo__gte=desde)
+    if hasta:
+        base = base.filter(fecha_prestamo__lte=hasta)
+    if dni:
+        base = base.filter(busqueda.empieza_con("alumno_dni", dni))
+    if libro:
+        base = busqueda.filtrar(base, libro, prefijo="ejemplar__titulo__")
+
+    qs = base.values("id", "alumno_nombre", "alumno_dni", "ejemplar__titulo__titulo", "fecha_prestamo", "vence", "estado")
+    p = {
+        "filtros": {
+            "estado": estado,
+            "desde": desde.isoformat() if desde else "",
+            "hasta": hasta.isoformat() if hasta else "",
+            "dni": dni,
+            "libro": libro,
+        },
+        "orden": orden,
+        "after": (request.GET.get("after") or "").strip(),
+        "before": (request.GET.get("before") or "").strip(),
+        "page": page,
+        "per_page": per_page,
+    }
+    return base, qs, p
+
+
+def _contexto_prestamos(p, pagina, total) -> dict:
+    pagina.total = total
+    data = pagina.items
     for d in data:
         d["alumno"] = d.pop("alumno_nombre")
         d["dni"] = d.pop("alumno_dni")
         d["libro"] = d.pop("ejemplar__titulo__titulo")
-    return render(request, "prestamos_list.html", {"prestamos": data})
+
+    pages = pagina.paginas
+    return {
+        "prestamos": data,
+        "filtros": p["filtros"],
+        "estados": Prestamo.ESTADO_PRESTAMO,
+        "orden": p["orden"],
+        "page": min(pagina.numero, pages), "pages": pages, "total": total,
+        "per_page": p["per_page"],
+        "querystring_base": urlencode({**p["filtros"], "orden": p["orden"], "per_page": p["per_page"]}),
+        "next_cursor": pagina.siguiente,
+        "prev_cursor": pagina.anterior,
+    }
+
+
+def prestamos_list(request):
+    """Listado paginado en el servidor (keyset) con filtros (ver _consulta_prestamos)."""
+    base, qs, p = _consulta_prestamos(request)
+    pagina = paginar_keyset(qs, orden=ORDENES_PRESTAMOS[p["orden"]], after=p["after"], before=p["before"],
+                            per_page=p["per_page"], numero=p["page"])
+    return render(request, "prestamos_list.html", _contexto_prestamos(p, pagina, contar_filas(base)))
 
 
 def prestamo_create(request):
+    # El campo "libro" se completa con titulos_disponibles (fetch mientras se escribe):
+    # el formulario no trae el catálogo.
     hoy = date.today()
     max_date = hoy + timedelta(days=30)
 
-    libros_opts = list(
-        Titulo.objects.filter(ejemplares__estado="DISPONIBLE")
-        .distinct()
-        .values_list("titulo", flat=True)
-        .order_by("titulo")
-    )
-
     if request.method == "POST":
         alumno = (request.POST.get("alumno") or request.POST.get("nombre") or "").strip()
         dni    = (request.POST.get("dni") or "").strip()
@@ -367,7 +453,7 @@ def prestamo_create(request):
         except ValueError:
             return render(request, "prestamo_form.html", {
                 "error": "Fecha inválida.",
-                "libros_opts": libros_opts, "hoy": hoy, "max_date": max_date,
+                "hoy": hoy, "max_date": max_date,
                 "nombre": alumno, "dni": dni, "libro": titulo_elegido,
                 "fecha_vencimiento": f_str,
             })
@@ -375,7 +461,7 @@ def prestamo_create(request):
         if not (hoy <= vence_dt <= max_date):
             return render(request, "prestamo_form.html", {
                 "error": "La fecha debe estar entre hoy y 30 días.",
-                "libros_opts": libros_opts, "hoy": hoy, "max_date": max_date,
+                "hoy": hoy, "max_date": max_date,
                 "nombre": alumno, "dni": dni, "libro": titulo_elegido,
                 "fecha_vencimiento": f_str,
             })
@@ -383,43 +469,59 @@ def prestamo_create(request):
         if vence_dt.weekday() in (5, 6):
             return render(request, "prestamo_form.html", {
                 "error": "La fecha de devolución no puede ser sábado ni domingo.",
-                "libros_opts": libros_opts, "hoy": hoy, "max_date": max_date,
+                "hoy": hoy, "max_date": max_date,
                 "nombre": alumno, "dni": dni, "libro": titulo_elegido,
                 "fecha_vencimiento": f_str,
             })
 
-        ej = (
-            Ejemplar.objects
-            .select_related("titulo")
-            .filter(titulo__titulo=titulo_elegido, estado="DISPONIBLE")
-            .first()
-        )
-        if not ej:
+        # Reserva atómica: si dos cajas van por el último ejemplar, sólo una lo obtiene.
+        try:
+            prestamos.prestar(alumno=alumno, dni=dni, vence=vence_dt, titulo=titulo_elegido, fecha=hoy)
+        except prestamos.SinEjemplaresDisponibles:
             return render(request, "prestamo_form.html", {
                 "error": "El título no tiene ejemplares disponibles.",
-                "libros_opts": libros_opts, "hoy": hoy, "max_date": max_date,
+                "hoy": hoy, "max_date": max_date,
                 "nombre": alumno, "dni": dni, "libro": titulo_elegido,
                 "fecha_vencimiento": f_str,
             })
 
-        with transaction.atomic():
-            prestamo = Prestamo.objects.create(
-                ejemplar=ej,
-                alumno_nombre=alumno,
-                alumno_dni=dni,
-                fecha_prestamo=hoy,
-                vence=vence_dt,
-                estado="ACTIVO",
-            )
-            ej.estado = "PRESTADO"
-            ej.save(update_fields=["estado"])
-
-        messages.success(request, f"Préstamo registrado para {alumno} · {ej.titulo.titulo}.")
+        messages.success(request, f"Préstamo registrado para {alumno} · {titulo_elegido}.")
         return redirect("prestamos_list")
 
-    return render(request, "prestamo_form.html", {
-        "libros_opts": libros_opts, "hoy": hoy, "max_date": max_date
-    })
+    return render(request, "prestamo_form.html", {"hoy": hoy, "max_date": max_date})
+
+
+AUTOCOMPLETE_MAX = 50
+
+
+def titulos_disponibles(request):
+    """
+    Autocompletado del formulario de préstamo: títulos con ejemplares libres.
+    ?q= (prefijo de cada palabra, índice FTS) &after= (cursor) &limit= (<= 50)
+    → {"items": [{"id", "titulo", "disponibles"}], "next": cursor | null}
+
+    Lee el contador Titulo.disponibles (sin JOIN con Ejemplar). La respuesta
+    se cachea unos segundos por versión del catálogo: cualquier préstamo o
+    devolución sube la versión y los prefijos calientes se recalculan.
+    """
+    q = busqueda.normalizar(request.GET.get("q") or "")[:100]
+    after = (request.GET.get("after") or "").strip()
+    try:
+        limite = max(1, min(int(request.GET.get("limit", 20)), AUTOCOMPLETE_MAX))
+    except ValueError:
+        limite = 20
+
+    firma = hashlib.sha1(f"{limite}:{after}:{q}".encode("utf-8")).hexdigest()
+    clave = f"autocomplete:v{cache_catalogo.version()}:{firma}"
+    datos = cache.get(clave)
+    if datos is None:
+        qs = Titulo.objects.filter(disponibles__gt=0).values("id", "titulo", "disponibles")
+        if q:
+            qs = busqueda.filtrar(qs, q)
+        pagina = paginar_keyset(qs, orden=ORDEN_LIBROS, after=after, per_page=limite)
+        datos = {"items": pagina.items, "next": pagina.siguiente or None}
+        cache.set(clave, datos, getattr(settings, "AUTOCOMPLETE_CACHE_SEGUNDOS", 30))
+    return JsonResponse(datos, json_dumps_params={"ensure_ascii": False, "separators": (",", ":")})
 
 
 def _mover_a_lunes_si_findes(d: date) -> date:
@@ -433,7 +535,7 @@ def _mover_a_lunes_si_findes(d: date) -> date:
 def prestamo_renovar(request, pk):
     """
     Suma 7 días al vencimiento si el préstamo está ACTIVO o RENOVADO.
-    No permite renovar si está DEVUELTO.
+    No permite renovar si está DEVUELTO. Si aun así sigue vencido, queda VENCIDO.
     """
     prestamo = get_object_or_404(Prestamo.objects.select_related("ejemplar__titulo"), pk=pk)
 
@@ -447,7 +549,7 @@ def prestamo_renovar(request, pk):
     #     return redirect("prestamos_list")
 
     prestamo.vence = prestamo.vence + timedelta(days=7)
-    prestamo.estado = "RENOVADO"
+    prestamo.estado = vencimientos.estado_tras_renovar(prestamo.vence)
     prestamo.save(update_fields=["vence", "estado"])
     messages.success(request, f"Préstamo renovado +7 días para «{prestamo.ejemplar.titulo.titulo}». Nuevo vencimiento: {prestamo.vence}.")
     return redirect("prestamos_list")
@@ -467,10 +569,8 @@ def prestamo_devolver(request, pk):
     with transaction.atomic():
         prestamo.estado = "DEVUELTO"
         prestamo.save(update_fields=["estado"])
-        ej = prestamo.ejemplar
-        if ej and ej.estado != "DISPONIBLE":
-            ej.estado = "DISPONIBLE"
-            ej.save(update_fields=["estado"])
+        if prestamo.ejemplar_id:
+            prestamos.liberar_ejemplar(prestamo.ejemplar_id)
 
     messages.success(request, f"Se marcó como devuelto: {prestamo.ejemplar.titulo.titulo}.")
     return redirect("prestamos_list")
@@ -484,13 +584,136 @@ def prestamo_eliminar(request, pk):
     prestamo = get_object_or_404(Prestamo.objects.select_related("ejemplar"), pk=pk)
 
     with transaction.atomic():
-        if prestamo.estado != "DEVUELTO" and prestamo.ejemplar:
-            ej = prestamo.ejemplar
-            if ej.estado != "DISPONIBLE":
-                ej.estado = "DISPONIBLE"
-                ej.save(update_fields=["estado"])
+        if prestamo.estado != "DEVUELTO" and prestamo.ejemplar_id:
+            prestamos.liberar_ejemplar(prestamo.ejemplar_id)
 
         prestamo.delete()
 
     messages.success(request, "Préstamo eliminado.")
     return redirect("prestamos_list")
+
+
+# -------------------------------------------------------------------
+# Mostrador: préstamo / devolución por código escaneado (JSON)
+# -------------------------------------------------------------------
+PLAZO_MOSTRADOR_DIAS = 7
+
+
+def _vence_mostrador(f_str: str, hoy: date):
+    """(vence, error). Sin fecha: hoy + 7 días, corrido al lunes si cae en fin de semana."""
+    if not f_str:
+        return _mover_a_lunes_si_findes(hoy + timedelta(days=PLAZO_MOSTRADOR_DIAS)), None
+    try:
+        vence = datetime.strptime(f_str, "%Y-%m-%d").date()
+    except ValueError:
+        return None, "Fecha inválida."
+    if not (hoy <= vence <= hoy + timedelta(days=30)):
+        return None, "La fecha debe estar entre hoy y 30 días."
+    if vence.weekday() in (5, 6):
+        return None, "La fecha de devolución no puede ser sábado ni domingo."
+    return vence, None
+
+
+@require_POST
+def prestamo_por_codigo(request):
+    """
+    Préstamo desde el lector: POST codigo, alumno, dni [, vence=YYYY-MM-DD].
+    → { ok: true, prestamo, codigo, titulo, alumno, vence }
+    404 si el código no existe, 409 si el ejemplar no está disponible.
+    """
+    hoy = date.today()
+    codigo = codigos.normalizar(request.POST.get("codigo"))
+    alumno = (request.POST.get("alumno") or "").strip()
+    dni = (request.POST.get("dni") or "").strip()
+    if not codigo or not alumno:
+        return JsonResponse({"ok": False, "error": "El código y el alumno son obligatorios."}, status=400)
+    vence, error = _vence_mostrador((request.POST.get("vence") or "").strip(), hoy)
+    if error:
+        return JsonResponse({"ok": False, "error": error}, status=400)
+
+    try:
+        p = prestamos.prestar_por_codigo(codigo=codigo, alumno=alumno, dni=dni, vence=vence, fecha=hoy)
+    except prestamos.CodigoDesconocido:
+        return JsonResponse({"ok": False, "error": f"No hay ningún ejemplar con código {codigo}."}, status=404)
+    except prestamos.EjemplarNoDisponible:
+        return JsonResponse({"ok": False, "error": f"El ejemplar {codigo} no está disponible."}, status=409)
+
+    titulo = Titulo.objects.filter(ejemplares__pk=p.ejemplar_id).values_list("titulo", flat=True).first()
+    return JsonResponse({"ok": True, "prestamo": p.pk, "codigo": codigo, "titulo": titulo,
+                         "alumno": alumno, "vence": vence.isoformat()})
+
+
+@require_POST
+def devolucion_por_codigo(request):
+    """
+    Devolución desde el lector: POST codigo.
+    → { ok: true, prestamo, codigo, titulo, alumno }
+    404 si el código no existe, 409 si el ejemplar no tiene préstamo abierto.
+    """
+    codigo = codigos.normalizar(request.POST.get("codigo"))
+    if not codigo:
+        return JsonResponse({"ok": False, "error": "El código es obligatorio."}, status=400)
+
+    try:
+        p = prestamos.devolver_por_codigo(codigo)
+    except prestamos.CodigoDesconocido:
+        return JsonResponse({"ok": False, "error": f"No hay ningún ejemplar con código {codigo}."}, status=404)
+    except prestamos.SinPrestamoAbierto:
+        return JsonResponse({"ok": False, "error": f"El ejemplar {codigo} no tiene un préstamo abierto."}, status=409)
+
+    return JsonResponse({"ok": True, "prestamo": p.pk, "codigo": codigo,
+                         "titulo": p.ejemplar.titulo.titulo, "alumno": p.alumno_nombre})
+
+
+# -------------------------------------------------------------------
+# Lotes: devolver / renovar / prestar muchos de una vez (ver core/lotes.py)
+# -------------------------------------------------------------------
+def _lista(request, campo) -> list[str]:
+    """Valores de un campo repetido o separados por comas / espacios / renglones."""
+    return [v for crudo in request.POST.getlist(campo) for v in re.split(r"[\s,;]+", crudo) if v]
+
+
+@require_POST
+def prestamos_lote(request):
+    """
+    POST accion=devolver|renovar|prestar, ids= (préstamos) y/o codigos= (ejemplares);
+    para prestar además alumno, dni [, vence=YYYY-MM-DD].
+    → { ok: true, accion, aplicados, rechazados, items: [{item, ok, detalle, prestamo}] }
+    Todo el lote va en una transacción; los ítems rechazados no frenan al resto.
+    """
+    accion = request.POST.get("accion")
+    if accion not in ("devolver", "renovar", "prestar"):
+        return JsonResponse({"ok": False, "error": "Acción inválida."}, status=400)
+    ids = _lista(request, "ids")
+    if not all(i.isdigit() for i in ids):
+        return JsonResponse({"ok": False, "error": "Los ids de préstamo deben ser números."}, status=400)
+    ids = [int(i) for i in ids]
+    lista_codigos = _lista(request, "codigos")
+    if not ids and not lista_codigos:
+        return JsonResponse({"ok": False, "error": "El lote está vacío."}, status=400)
+
+    try:
+        if accion == "prestar":
+            alumno = (request.POST.get("alumno") or "").strip()
+            dni = (request.POST.get("dni") or "").strip()
+            if ids or not alumno:
+                return JsonResponse({"ok": False, "error": "Para prestar se mandan códigos y el alumno."}, status=400)
+            vence, error = _vence_mostrador((request.POST.get("vence") or "").strip(), date.today())
+            if error:
+                return JsonResponse({"ok": False, "error": error}, status=400)
+            resultados = lotes.prestar(lista_codigos, alumno=alumno, dni=dni, vence=vence)
+        elif accion == "devolver":
+            resultados = lotes.devolver(ids, lista_codigos)
+        else:
+            resultados = lotes.renovar(ids, lista_codigos)
+    except lotes.LoteDemasiadoGrande as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+    except (prestamos.EjemplarNoDisponible, prestamos.SinPrestamoAbierto):
+        return JsonResponse({"ok": False, "error": "Otro puesto modificó parte del lote; volvé a enviarlo."},
+                            status=409)
+
+    aplicados = sum(r.ok for r in resultados)
+    return JsonResponse({
+        "ok": True, "accion": accion, "aplicados": aplicados, "rechazados": len(resultados) - aplicados,
+        "items": [asdict(r) for r in resultados],
+    }, json_dumps_params={"ensure_ascii": False})
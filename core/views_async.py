@@ -0,0 +1,78 @@
+"""
+Versiones async de las vistas de lectura (dashboard, libros, préstamos) y
+del alta de categorías por AJAX, sobre el ORM async de Django.
+
+Las usa la configuración ASGI (biblioteca/asgi.py → biblioteca/urls_async.py);
+con WSGI siguen sirviéndose las de core/views.py. Los parámetros, las
+consultas y el contexto salen de los mismos helpers de core/views.py: sólo
+cambia cómo se ejecutan.
+
+Las consultas independientes de una vista (página + conteo; stock + listas
+de vencimientos) se lanzan juntas con asyncio.gather. Ojo: el ORM async de
+Django todavía corre cada query con sync_to_async(thread_sensitive=True),
+así que las de un mismo request se ejecutan una tras otra sobre su conexión.
+La ganancia con ASGI está en que mientras tanto el event loop atiende a
+otros clientes (sobre todo los lentos), sin fijar un worker por cada uno.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.views.decorators.http import require_POST
+
+from . import metricas
+from .models import Categoria
+from .paginacion import acontar_filas, apaginar_keyset
+from .views import (
+    ORDEN_LIBROS, ORDENES_PRESTAMOS,
+    _consulta_libros, _consulta_prestamos, _contexto_dashboard, _contexto_libros,
+    _contexto_pagina_libros, _contexto_prestamos, _params_libros,
+)
+
+# El render va a sync: los context processors (auth, messages) pueden leer la sesión.
+arender = sync_to_async(render)
+
+
+async def dashboard(request):
+    datos = await metricas.ametricas_dashboard()
+    return await arender(request, "dashboard.html", _contexto_dashboard(datos))
+
+
+async def libros_list(req):
+    p = _params_libros(req)
+    # Caché del catálogo (y la lista de categorías si no está): un salto a sync.
+    ctx, cacheada = await sync_to_async(_contexto_libros)(p)
+    if cacheada:
+        return await arender(req, "libros_list.html", ctx)
+
+    base, qs = _consulta_libros(p)
+    pagina, total = await asyncio.gather(
+        apaginar_keyset(qs, orden=ORDEN_LIBROS, after=p["after"], before=p["before"],
+                        per_page=p["per_page"], numero=p["page"]),
+        acontar_filas(base),
+    )
+    ctx.update(_contexto_pagina_libros(p, pagina, total))
+    return await arender(req, "libros_list.html", ctx)
+
+
+async def prestamos_list(request):
+    base, qs, p = _consulta_prestamos(request)
+    pagina, total = await asyncio.gather(
+        apaginar_keyset(qs, orden=ORDENES_PRESTAMOS[p["orden"]], after=p["after"], before=p["before"],
+                        per_page=p["per_page"], numero=p["page"]),
+        acontar_filas(base),
+    )
+    return await arender(request, "prestamos_list.html", _contexto_prestamos(p, pagina, total))
+
+
+@require_POST
+async def categoria_create_ajax(request):
+    """Como views.categoria_create_ajax: { ok: true, id, nombre, created, message }."""
+    nombre = (request.POST.get("nombre") or "").strip()
+    if not nombre:
+        return JsonResponse({"ok": False, "error": "El nombre es obligatorio."}, status=400)
+
+    cat, created = await Categoria.objects.aget_or_create(nombre=nombre)
+    msg = f"Categoría «{cat.nombre}» {'creada' if created else 'ya existente, seleccionada'}."
+    return JsonResponse({"ok": True, "id": cat.id, "nombre": cat.nombre, "created": created, "message": msg})